@@ -13,4 +13,4 @@ python scripts/reset/01_pacfish_update_station_data.py
 python scripts/update/01_pacfish_update_7-day.py
 
 # Creating downstream databases
-Rscript scripts/update/03_pacfish_create_ancil_dbases.R
\ No newline at end of file
+python scripts/update/03_pacfish_update_daily.py
\ No newline at end of file
@@ -13,5 +13,5 @@ python scripts/reset/01_pacfish_update_station_data.py
 python scripts/update/01_pacfish_update_selenium.py -d 31
 
 # Creating downstream databases
-Rscript scripts/update/03_pacfish_create_ancil_dbases.R
+python scripts/update/03_pacfish_update_daily.py
 
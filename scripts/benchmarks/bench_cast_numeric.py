@@ -0,0 +1,127 @@
+# Date: 17/10/2026
+
+# Description: Micro-benchmark comparing the vectorized castDataColsToNumeric
+# against the original branch-per-column version on archive-sized frames
+
+# %% ==== Loading libraries ====
+import os
+import sys
+import time
+import contextlib
+from io import StringIO
+from pathlib import Path
+os.chdir(Path(__file__).parent.parent.parent)
+sys.path.append(os.getcwd())
+import numpy as np
+import pandas as pd
+from optparse import OptionParser
+from scripts.common.station_format import castDataColsToNumeric
+
+# %% Initializing option parsing
+parser = OptionParser()
+parser.add_option(
+    "-n", "--rows",
+    dest="rows",
+    action="store",
+    type="int",
+    default=200000,
+    help="""
+    Number of rows in each test frame (roughly 20 years of hourly readings by default)
+    """
+)
+parser.add_option(
+    "-r", "--repeats",
+    dest="repeats",
+    action="store",
+    type="int",
+    default=5,
+    help="""
+    Number of timed runs of each implementation (the fastest is reported)
+    """
+)
+options, args = parser.parse_args()
+
+# %% ==== Original implementation, kept for comparison ====
+def legacyCastDataColsToNumeric(dat, colnames):
+    ncols = len(colnames)
+    if ncols == 3:
+        col1_is_str = pd.api.types.is_string_dtype(dat.iloc[:, 1])
+        col2_is_str = pd.api.types.is_string_dtype(dat.iloc[:, 2])
+        if col1_is_str and col2_is_str:
+            estimated_index1 = dat.iloc[:,1].str.contains(pat="\\*\\*Estimated", regex=True)
+            estimated_index2 = dat.iloc[:,2].str.contains(pat="\\*\\*Estimated", regex=True)
+            estimated_index = estimated_index1 | estimated_index2
+            dat['Code'] = [21 if i else '' for i in estimated_index]
+            dat.iloc[:,1] = dat.iloc[:,1].str.replace(pat="\\*\\*Estimated",repl='',regex=True).astype(float)
+            dat.iloc[:,2] = dat.iloc[:,2].str.replace(pat="\\*\\*Estimated",repl='',regex=True).astype(float)
+        elif col1_is_str:
+            estimated_index = dat.iloc[:,1].str.contains(pat="\\*\\*Estimated", regex=True)
+            dat['Code'] = [21 if i else '' for i in estimated_index]
+            dat.iloc[:,1] = dat.iloc[:,1].str.replace(pat="\\*\\*Estimated",repl='',regex=True).astype(float)
+        elif col2_is_str:
+            estimated_index = dat.iloc[:,2].str.contains(pat="\\*\\*Estimated", regex=True)
+            dat['Code'] = [21 if i else '' for i in estimated_index]
+            dat.iloc[:,2] = dat.iloc[:,2].str.replace(pat="\\*\\*Estimated",repl='',regex=True).astype(float)
+        else:
+            dat['Code'] = ''
+    else:
+        col1_is_str = pd.api.types.is_string_dtype(dat.iloc[:, 1])
+        if col1_is_str:
+            estimated_index = dat.iloc[:,1].str.contains(pat="\\*\\*Estimated", regex=True)
+            dat['Code'] = [21 if i else '' for i in estimated_index]
+            dat.iloc[:,1] = dat.iloc[:,1].str.replace(pat="\\*\\*Estimated",repl='',regex=True).astype(float)
+        else:
+            dat['Code'] = ''
+    return dat
+
+# %% ==== Building test frames ====
+def make_frame(nrows, ncols, estimated_share=0.1, seed=0):
+    """
+    Building a frame shaped like a parsed station table: a Time column and
+    ncols data columns of text values, some tagged as estimated
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'Time': pd.date_range('2000-01-01', periods=nrows, freq='h').astype(str)})
+    for i in range(ncols):
+        values = rng.random(nrows).round(3).astype(str).astype(object)
+        tagged = rng.random(nrows) < estimated_share
+        values[tagged] = values[tagged] + '**Estimated'
+        df['Value' + str(i + 1)] = pd.Series(values, dtype=object)
+    return df
+
+def best_time(func, df, repeats):
+    """
+    Fastest of several runs of a cleaning function on fresh copies of a frame
+    """
+    times = []
+    for _ in range(repeats):
+        dat = df.copy()
+        start = time.perf_counter()
+        # Silencing the progress messages printed by the cleaning functions
+        with contextlib.redirect_stdout(StringIO()):
+            func(dat, dat.columns)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+# %% ==== Running the benchmark ====
+rows = []
+for ncols in (1, 2):
+    df = make_frame(options.rows, ncols)
+    # Checking that both implementations produce the same values and codes
+    new = castDataColsToNumeric(df.copy(), df.columns)
+    old = legacyCastDataColsToNumeric(df.copy(), df.columns)
+    assert np.allclose(new.iloc[:, 1:ncols + 1].to_numpy(float), old.iloc[:, 1:ncols + 1].to_numpy(float))
+    assert (new['Code'] == old['Code'].astype(str)).all()
+
+    legacy = best_time(legacyCastDataColsToNumeric, df, options.repeats)
+    vectorized = best_time(castDataColsToNumeric, df, options.repeats)
+    rows.append({
+        'data_columns': ncols,
+        'rows': options.rows,
+        'legacy_s': round(legacy, 4),
+        'vectorized_s': round(vectorized, 4),
+        'speedup': round(legacy / vectorized, 2),
+    })
+
+print(pd.DataFrame(rows).to_string(index=False))
+# %%
@@ -0,0 +1,91 @@
+# Date: 17/10/2026
+
+# Description: Micro-benchmark comparing the binary COPY encoding used by the
+# bulk loader against writing the same frame as csv with to_csv
+
+# %% ==== Loading libraries ====
+import os
+import sys
+import time
+from io import StringIO
+from pathlib import Path
+os.chdir(Path(__file__).parent.parent.parent)
+sys.path.append(os.getcwd())
+import numpy as np
+import pandas as pd
+from optparse import OptionParser
+from scripts.common.bulk_loader import encode_binary_rows
+from scripts.common.hourly_load import HOURLY_COLS
+
+# %% Initializing option parsing
+parser = OptionParser()
+parser.add_option(
+    "-n", "--rows",
+    dest="rows",
+    action="store",
+    type="int",
+    default=200000,
+    help="""
+    Number of rows in the test frame (one loader transaction by default)
+    """
+)
+parser.add_option(
+    "-r", "--repeats",
+    dest="repeats",
+    action="store",
+    type="int",
+    default=5,
+    help="""
+    Number of timed runs of each encoding (the fastest is reported)
+    """
+)
+options, args = parser.parse_args()
+
+# %% ==== Building the test frame ====
+def make_frame(nrows, estimated_share=0.05, missing_share=0.02, seed=0):
+    """
+    Building a frame shaped like formatted station data: hourly readings of
+    two parameters, some estimated and some missing
+    """
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range('2000-01-01', periods=nrows, freq='h')
+    values = rng.random(nrows).round(3)
+    values[rng.random(nrows) < missing_share] = np.nan
+    estimated = rng.random(nrows) < estimated_share
+    return pd.DataFrame({
+        'STATION_NUMBER': 'PF_001',
+        'STATION_NAME': 'Example Creek',
+        'Date': ts.normalize(),
+        'Time': ts.strftime('%H:%M:%S'),
+        'Value': values,
+        'Parameter': np.where(np.arange(nrows) % 2 == 0, 'Water Level', 'Water Temperature'),
+        'Code': np.where(estimated, '21', ''),
+        'Comments': '',
+    })
+
+def encode_csv(df):
+    sio = StringIO()
+    df.to_csv(sio, sep=',', header=False, index=False, columns=HOURLY_COLS)
+    return sio.getvalue()
+
+def best_time(func, df, repeats):
+    """
+    Fastest of several runs of an encoding, and the size of its output
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out = func(df)
+        times.append(time.perf_counter() - start)
+    return min(times), len(out)
+
+# %% ==== Running the benchmark ====
+df = make_frame(options.rows)
+csv_s, csv_size = best_time(encode_csv, df, options.repeats)
+binary_s, binary_size = best_time(encode_binary_rows, df, options.repeats)
+print(pd.DataFrame([
+    {'encoding': 'csv', 'rows': options.rows, 'seconds': round(csv_s, 4), 'bytes': csv_size},
+    {'encoding': 'binary', 'rows': options.rows, 'seconds': round(binary_s, 4), 'bytes': binary_size},
+]).to_string(index=False))
+print('Speedup:', round(csv_s / binary_s, 2))
+# %%
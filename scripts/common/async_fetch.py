@@ -0,0 +1,102 @@
+# Date: 16/10/2026
+
+# Description: An asyncio based engine for downloading many station pages at
+# once, with a global and a per-host limit on the number of open requests
+
+import asyncio
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+# Sentinel placed on the result queue once every download has finished
+_DONE = object()
+
+async def _fetch_one(key, url, fetch, executor, global_sem, host_sems, out):
+    """
+    Private function that downloads a single url once both the global and the
+    per-host concurrency slots are free, placing the result on the output queue
+    """
+    # Getting the semaphore associated with this url's host
+    host_sem = host_sems[urlsplit(url).netloc]
+    async with global_sem, host_sem:
+        try:
+            # Running the blocking download in the thread pool
+            page = await asyncio.get_running_loop().run_in_executor(executor, fetch, url)
+            out.put((key, page, None))
+        except Exception as e:
+            # Passing errors back to the caller rather than stopping the run
+            out.put((key, None, e))
+
+async def _fetch_all(urls, fetch, max_concurrency, max_per_host, out):
+    """
+    Private function that schedules every download and waits for them to finish
+    """
+    global_sem = asyncio.Semaphore(max_concurrency)
+    # One semaphore per host, so a single slow server can't take all the slots
+    host_sems = {
+        host: asyncio.Semaphore(max_per_host)
+        for host in {urlsplit(url).netloc for url in urls.values()}
+    }
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        await asyncio.gather(*[
+            _fetch_one(key, url, fetch, executor, global_sem, host_sems, out)
+            for key, url in urls.items()
+        ])
+
+def fetch_as_completed(urls, fetch, max_concurrency=8, max_per_host=4):
+    """
+    Downloading a dictionary of urls concurrently with a fetch(url) function
+    (usually HttpClient.get), yielding (key, page, error) tuples in the order
+    that the downloads finish
+    """
+    # Checking that the limits are valid
+    errMessage = "max_concurrency and max_per_host must both be at least 1"
+    assert (max_concurrency >= 1 and max_per_host >= 1), errMessage
+
+    # Queue through which finished downloads are handed to the caller
+    out = queue.Queue()
+
+    # Running the event loop in a background thread, so that the caller can
+    # process each page (formatting, database writes) while the rest download
+    def run_loop():
+        try:
+            asyncio.run(_fetch_all(urls, fetch, max_concurrency, max_per_host, out))
+        finally:
+            out.put(_DONE)
+    worker = threading.Thread(target=run_loop, daemon=True)
+    worker.start()
+
+    # Handing back results as they arrive
+    while True:
+        item = out.get()
+        if item is _DONE:
+            break
+        yield item
+    worker.join()
+
+def flatten_links(links):
+    """
+    Flattening a {group: {station: url}} dictionary into a single dictionary
+    keyed by (group, station)
+    """
+    return {
+        (url_grp, url_name): url
+        for url_grp in links
+        for url_name, url in links[url_grp].items()
+    }
+
+def fetch_link_groups(links, client, max_concurrency=8, max_per_host=4):
+    """
+    Downloading every link in a {group: {station: url}} dictionary, returning
+    the responses (or download errors) in the same layout, so that each page
+    can be both validated and parsed from a single request
+    """
+    # Flattening the links so that all groups are downloaded together
+    all_links = flatten_links(links)
+    # Collecting responses back into their groups
+    responses = {url_grp: {} for url_grp in links}
+    for (url_grp, url_name), page, err in fetch_as_completed(
+            all_links, client.get, max_concurrency, max_per_host):
+        responses[url_grp][url_name] = page if err is None else err
+    return responses
@@ -0,0 +1,280 @@
+# Date: 17/10/2026
+
+# Description: A bulk loader for the hourly table that gathers formatted
+# station frames and writes them with COPY ... FROM STDIN (FORMAT binary),
+# loading many stations per transaction. Rows are encoded to the Postgres
+# binary COPY format with numpy, driven by a spec of each column's type, and
+# can be streamed to COPY lazily from a generator of frames
+
+import struct
+import time
+import numpy as np
+import pandas as pd
+from scripts.common.hourly_load import merge_staging, create_staging_table, HOURLY_COLUMN_TYPES
+
+# Temporary table that bulk loads are copied into before being merged
+BULK_STAGING = 'hourly_bulk_staging'
+
+# Binary COPY file header (signature, flags and header extension length) and
+# trailer
+COPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+COPY_TRAILER = struct.pack('>h', -1)
+
+# Postgres timestamps and dates count from 2000-01-01
+PG_EPOCH = np.datetime64('2000-01-01T00:00:00', 'us')
+PG_EPOCH_DATE = np.datetime64('2000-01-01', 'D')
+
+# Big-endian numpy type of each fixed-width Postgres type
+FIXED_TYPES = {
+    'bool': '>u1',
+    'int2': '>i2',
+    'int4': '>i4',
+    'int8': '>i8',
+    'float4': '>f4',
+    'float8': '>f8',
+    'timestamp': '>i8',
+    'date': '>i4',
+}
+
+def _fixed_values(values, pg_type):
+    """
+    Private function that converts a fixed-width column to the values sent
+    to Postgres, returning them with a mask of missing values
+    """
+    values = pd.Series(values)
+    null = values.isna().to_numpy()
+    if pg_type == 'timestamp':
+        stamps = pd.to_datetime(values).to_numpy(dtype='datetime64[us]')
+        data = (stamps - PG_EPOCH).astype('int64')
+    elif pg_type == 'date':
+        days = pd.to_datetime(values).to_numpy(dtype='datetime64[D]')
+        data = (days - PG_EPOCH_DATE).astype('int64')
+    else:
+        data = values.to_numpy()
+    return np.where(null, 0, data), null
+
+def encode_binary_rows(df, column_types=HOURLY_COLUMN_TYPES):
+    """
+    Encoding the rows of a frame as binary COPY tuples (without the file
+    header and trailer). Rows are grouped by the byte length of each of their
+    fields (few groups in practice, e.g. with or without an estimated code),
+    and every group is written as a numpy record array with one fixed-size
+    field per column. Rows are returned grouped, since their order doesn't
+    matter to COPY
+    """
+    nrows = df.shape[0]
+    # Byte length of each column's field in every row (-1 for nulls), and
+    # the values to write
+    columns = []
+    for col, pg_type in column_types.items():
+        if pg_type == 'text':
+            # Encoding each distinct value only once
+            codes, uniques = pd.factorize(pd.Series(df[col]))
+            encoded = [str(u).encode('utf-8') for u in uniques] + [b'']
+            # Missing values (code -1) point at the last entry
+            codes = np.where(codes < 0, len(encoded) - 1, codes)
+            lens = np.array([len(b) for b in encoded[:-1]] + [-1], dtype=np.int64)[codes]
+            columns.append((pg_type, lens, (encoded, codes)))
+        else:
+            data, null = _fixed_values(df[col], pg_type)
+            width = np.dtype(FIXED_TYPES[pg_type]).itemsize
+            lens = np.where(null, -1, width)
+            columns.append((pg_type, lens, data))
+
+    # Numbering each distinct combination of field lengths (a row layout),
+    # adding one column at a time and renumbering so the ids stay small
+    layout_ids = np.zeros(nrows, dtype=np.int64)
+    for _, lens, _ in columns:
+        codes, uniques = pd.factorize(lens)
+        layout_ids, _ = pd.factorize(layout_ids * len(uniques) + codes)
+    order = np.argsort(layout_ids, kind='stable')
+    bounds = np.flatnonzero(np.diff(layout_ids[order])) + 1
+    out = []
+    for rows in np.split(order, bounds):
+        if len(rows) == 0:
+            continue
+        layout = [lens[rows[0]] for _, lens, _ in columns]
+        # Record layout: field count, then each field's length and value
+        fields = [('n', '>i2')]
+        for j, (pg_type, _, _) in enumerate(columns):
+            fields.append(('l' + str(j), '>i4'))
+            if layout[j] > 0:
+                fields.append(('v' + str(j), 'S' + str(layout[j]) if pg_type == 'text' else FIXED_TYPES[pg_type]))
+        rec = np.empty(len(rows), dtype=fields)
+        rec['n'] = len(columns)
+        for j, (pg_type, _, values) in enumerate(columns):
+            rec['l' + str(j)] = layout[j]
+            if layout[j] <= 0:
+                continue
+            if pg_type == 'text':
+                encoded, codes = values
+                rec['v' + str(j)] = np.array(encoded, dtype='S' + str(layout[j]))[codes[rows]]
+            else:
+                rec['v' + str(j)] = values[rows]
+        out.append(rec.tobytes())
+    return b''.join(out)
+
+class CopyStream:
+    """
+    A read-only file-like object that serializes frames to the binary COPY
+    format only as COPY reads them, so a generator of frames (e.g. batches
+    parsed from a streamed page) can be loaded with a single COPY while only
+    one frame is held in memory at a time. Counts the rows and frames sent
+    """
+    def __init__(self, frames, column_types=HOURLY_COLUMN_TYPES):
+        self.column_types = column_types
+        self.rows = 0
+        self.frames = 0
+        self._blocks = self._iter_blocks(frames)
+        self._block = b''
+        self._pos = 0
+
+    def _iter_blocks(self, frames):
+        """
+        Private method yielding the header, each encoded frame and the trailer
+        """
+        yield COPY_HEADER
+        for df in frames:
+            self.rows += df.shape[0]
+            self.frames += 1
+            if df.shape[0] > 0:
+                yield encode_binary_rows(df, self.column_types)
+        yield COPY_TRAILER
+
+    def read(self, size=-1):
+        """
+        Reading up to size bytes (everything left if size is negative),
+        encoding further frames as needed. Returns b'' once all frames are sent
+        """
+        out = []
+        nbytes = 0
+        while size < 0 or nbytes < size:
+            if self._pos >= len(self._block):
+                self._block = next(self._blocks, None)
+                self._pos = 0
+                if self._block is None:
+                    self._block = b''
+                    break
+                continue
+            end = len(self._block) if size < 0 else min(len(self._block), self._pos + size - nbytes)
+            out.append(self._block[self._pos:end])
+            nbytes += end - self._pos
+            self._pos = end
+        return b''.join(out)
+
+def copy_frames(cursor, frames, staging=BULK_STAGING, column_types=HOURLY_COLUMN_TYPES):
+    """
+    Copying an iterable of frames (e.g. a generator) into a staging table with
+    a single binary COPY, encoding each frame only when COPY reads it. Returns
+    the number of rows copied
+    """
+    stream = CopyStream(frames, column_types)
+    cursor.copy_expert(
+        'copy {} ({}) from stdin with (format binary)'.format(
+            staging, ', '.join('"' + col + '"' for col in column_types)
+        ),
+        stream
+    )
+    return stream.rows
+
+class BulkLoader:
+    """
+    Loader that gathers formatted station frames and writes them to the hourly
+    table in batches of at least commit_rows rows, one transaction per batch.
+    Each batch is copied in binary format into a staging table and merged with
+    merge_staging (so new readings are inserted, revised readings updated and
+    unchanged readings skipped). If a batch fails its frames are retried one
+    at a time, so a single bad frame only fails itself. Frames can be tagged
+    (e.g. by data type and station) to see which were committed
+    """
+    def __init__(self, conn, schema, commit_rows=200000, column_types=HOURLY_COLUMN_TYPES):
+        self.conn = conn
+        self.schema = schema
+        self.commit_rows = commit_rows
+        self.column_types = column_types
+        self.staging = BULK_STAGING
+        self._frames = []
+        self._tags = []
+        self._pending_rows = 0
+        # Tags of committed frames, and the error raised for each failed frame
+        self.committed = []
+        self.failed = {}
+        # Load statistics
+        self.rows = 0
+        self.counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        self.transactions = 0
+        self.seconds = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def add(self, df, tag=None):
+        """
+        Queueing a frame for loading, loading the queue once it holds enough rows
+        """
+        self._frames.append(df)
+        self._tags.append(tag)
+        self._pending_rows += df.shape[0]
+        if self._pending_rows >= self.commit_rows:
+            self.flush()
+
+    def _load(self, frames):
+        """
+        Private method that copies frames into the staging table and merges
+        them into the hourly table in a single transaction
+        """
+        cursor = self.conn.cursor()
+        try:
+            create_staging_table(cursor, self.staging, self.column_types)
+            copy_frames(cursor, frames, self.staging, self.column_types)
+            counts = merge_staging(cursor, self.schema, self.staging)
+            self.conn.commit()
+            self.transactions += 1
+            for key in self.counts:
+                self.counts[key] += counts[key]
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def flush(self):
+        """
+        Loading every queued frame
+        """
+        frames, tags, nrows = self._frames, self._tags, self._pending_rows
+        self._frames, self._tags, self._pending_rows = [], [], 0
+        if len(frames) == 0:
+            return
+        start = time.perf_counter()
+        try:
+            self._load(frames)
+            self.rows += nrows
+            self.committed.extend(tags)
+        except Exception as e:
+            print("Batch load failed, retrying", len(frames), "frames one at a time -", str(e))
+            for df, tag in zip(frames, tags):
+                try:
+                    self._load([df])
+                    self.rows += df.shape[0]
+                    self.committed.append(tag)
+                except Exception as e:
+                    self.failed[tag] = e
+        self.seconds += time.perf_counter() - start
+
+    def summary(self):
+        """
+        Summarising the rows loaded and the load rate for the run report
+        """
+        return {
+            'rows': self.rows,
+            'inserted': self.counts['inserted'],
+            'updated': self.counts['updated'],
+            'unchanged': self.counts['unchanged'],
+            'transactions': self.transactions,
+            'seconds': round(self.seconds, 2),
+            'rows_per_sec': round(self.rows / self.seconds) if self.seconds > 0 else None,
+        }
@@ -0,0 +1,179 @@
+# Date: 17/10/2026
+
+# Description: Incremental maintenance of the daily table (the mean value and
+# number of observations of each station and parameter by day). Loads into
+# the hourly table record the (station, day, parameter) keys they touch in a
+# pending table, and only those daily rows are recomputed and upserted by the
+# daily update, so its cost follows the amount of new data rather than the
+# full history
+
+# Tables holding the daily aggregates and the days waiting to be recomputed
+DAILY_TABLE = 'daily'
+PENDING_TABLE = 'daily_pending'
+
+# Columns identifying a daily row
+DAILY_KEY = ['STATION_NUMBER', 'Date', 'Parameter']
+
+def pending_days_cte(schema, rows):
+    """
+    Getting a common table expression (named pending_days) that records the
+    days of the hourly rows returned by another expression of the same
+    statement (with STATION_NUMBER, Parameter and ts columns) as pending
+    """
+    return """
+        pending_days as (
+            insert into {schema}.{pending} ("STATION_NUMBER", "Date", "Parameter")
+            select distinct "STATION_NUMBER", date_trunc('day', ts), "Parameter" from {rows}
+            on conflict do nothing
+        )
+        """.format(schema=schema, pending=PENDING_TABLE, rows=rows)
+
+def _aggregate_sql(schema, days=None):
+    """
+    Private function that builds the query aggregating the hourly table by
+    station, day and parameter, optionally limited to the days listed in
+    another table
+    """
+    if days is None:
+        return """
+            select "STATION_NUMBER", max("STATION_NAME") as "STATION_NAME",
+                date_trunc('day', ts) as "Date", avg("Value") as "Value",
+                count(*) as "numObservations", "Parameter"
+            from {schema}.hourly
+            group by "STATION_NUMBER", date_trunc('day', ts), "Parameter"
+            """.format(schema=schema)
+    return """
+        select d."STATION_NUMBER", max(h."STATION_NAME") as "STATION_NAME",
+            d."Date", avg(h."Value") as "Value",
+            count(*) as "numObservations", d."Parameter"
+        from {days} d
+        join {schema}.hourly h
+        on h."STATION_NUMBER" = d."STATION_NUMBER"
+        and h."Parameter" = d."Parameter"
+        and h.ts >= d."Date" and h.ts < d."Date" + interval '1 day'
+        group by d."STATION_NUMBER", d."Date", d."Parameter"
+        """.format(schema=schema, days=days)
+
+def ensure_daily_tables(conn, schema):
+    """
+    Creating the daily table (built from the full hourly table) and the
+    pending table if they don't exist yet. A daily table created by the
+    original R script is given the unique key needed for upserts
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("select to_regclass(%s)", (schema + '.' + DAILY_TABLE,))
+        if cursor.fetchone()[0] is None:
+            print("Creating the daily table...")
+            cursor.execute(
+                """
+                create table {schema}.{daily} (
+                    "STATION_NUMBER" text not null,
+                    "STATION_NAME" text,
+                    "Date" timestamp not null,
+                    "Value" double precision,
+                    "numObservations" bigint,
+                    "Parameter" text not null
+                )
+                """.format(schema=schema, daily=DAILY_TABLE)
+            )
+            cursor.execute(
+                'insert into {}.{} {}'.format(schema, DAILY_TABLE, _aggregate_sql(schema))
+            )
+        cursor.execute(
+            """
+            create unique index if not exists {daily}_key
+            on {schema}.{daily} ("STATION_NUMBER", "Date", "Parameter")
+            """.format(schema=schema, daily=DAILY_TABLE)
+        )
+        cursor.execute(
+            """
+            create table if not exists {schema}.{pending} (
+                "STATION_NUMBER" text not null,
+                "Date" timestamp not null,
+                "Parameter" text not null,
+                primary key ("STATION_NUMBER", "Date", "Parameter")
+            )
+            """.format(schema=schema, pending=PENDING_TABLE)
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def refresh_daily(conn, schema):
+    """
+    Recomputing the daily rows of every pending day in a single transaction:
+    their aggregates are upserted, and days with no hourly readings left are
+    removed. Days recorded by loads running at the same time stay pending for
+    the next refresh. Returns the number of days refreshed
+    """
+    cursor = conn.cursor()
+    try:
+        # Taking the pending days
+        cursor.execute(
+            """
+            create temp table daily_refresh on commit drop as
+            with taken as (delete from {schema}.{pending} returning *)
+            select * from taken
+            """.format(schema=schema, pending=PENDING_TABLE)
+        )
+        ndays = cursor.rowcount
+        # Upserting their aggregates
+        cursor.execute(
+            """
+            insert into {schema}.{daily}
+                ("STATION_NUMBER", "STATION_NAME", "Date", "Value", "numObservations", "Parameter")
+            {aggregate}
+            on conflict ("STATION_NUMBER", "Date", "Parameter") do update
+            set ("STATION_NAME", "Value", "numObservations") =
+                (excluded."STATION_NAME", excluded."Value", excluded."numObservations")
+            """.format(schema=schema, daily=DAILY_TABLE,
+                       aggregate=_aggregate_sql(schema, 'daily_refresh'))
+        )
+        # Removing days whose readings have all been deleted
+        cursor.execute(
+            """
+            delete from {schema}.{daily} d
+            using daily_refresh r
+            where d."STATION_NUMBER" = r."STATION_NUMBER"
+            and d."Date" = r."Date"
+            and d."Parameter" = r."Parameter"
+            and not exists (
+                select 1 from {schema}.hourly h
+                where h."STATION_NUMBER" = r."STATION_NUMBER"
+                and h."Parameter" = r."Parameter"
+                and h.ts >= r."Date" and h.ts < r."Date" + interval '1 day'
+            )
+            """.format(schema=schema, daily=DAILY_TABLE)
+        )
+        conn.commit()
+        return ndays
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def rebuild_daily(conn, schema):
+    """
+    Recomputing the whole daily table from the hourly table, clearing the
+    pending days. Returns the number of daily rows
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute('truncate {}.{}'.format(schema, PENDING_TABLE))
+        cursor.execute('truncate {}.{}'.format(schema, DAILY_TABLE))
+        cursor.execute(
+            'insert into {}.{} {}'.format(schema, DAILY_TABLE, _aggregate_sql(schema))
+        )
+        nrows = cursor.rowcount
+        conn.commit()
+        return nrows
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
@@ -0,0 +1,144 @@
+# Date: 17/10/2026
+
+# Description: A single-pass extractor for the CenteredGrid data table on
+# Pacfish station pages, built on lxml. Replaces parsing the page with
+# BeautifulSoup, re-serializing the table and parsing it again with
+# pd.read_html
+
+import numpy as np
+import pandas as pd
+from lxml import etree
+from lxml import html as lxml_html
+
+# Compiled selector for the data table
+_FIND_GRID = etree.XPath(
+    "//table[contains(concat(' ', normalize-space(@class), ' '), ' CenteredGrid ')]"
+)
+
+def grid_column(values):
+    """
+    Converting a list of cell strings to a column. Columns where every
+    non-blank cell is numeric become float, otherwise the strings are kept (so
+    that e.g. '**Estimated' tags can be cleaned later). Blank cells become NaN
+    in both cases, matching pd.read_html
+    """
+    col = pd.Series(values, dtype=object)
+    blank = col == ''
+    col[blank] = np.nan
+    num = pd.to_numeric(col, errors='coerce')
+    if (num.isna() & ~blank).any():
+        return col
+    return num.astype('float64')
+
+def row_cells(row):
+    """
+    Reading the cell text of a table row
+    """
+    return [''.join(cell.itertext()).strip() for cell in row if cell.tag in ('th', 'td')]
+
+def find_centered_grid(content):
+    """
+    Finding the CenteredGrid table element in a page's html (bytes or str).
+    Returns None if the page has no such table
+    """
+    tables = _FIND_GRID(lxml_html.document_fromstring(content))
+    return tables[0] if len(tables) > 0 else None
+
+def read_centered_grid(content):
+    """
+    Extracting the CenteredGrid table from a page's html (bytes or str) as a
+    dataframe. A drop-in replacement for pd.read_html(str(stat_table))[0]
+    """
+    table = find_centered_grid(content)
+    if table is None:
+        raise ValueError("No CenteredGrid table found in page")
+
+    # Reading the header and the cells of every row in a single pass
+    header = None
+    columns = None
+    for row in table.iter('tr'):
+        cells = row_cells(row)
+        if header is None:
+            header = cells
+            columns = [[] for _ in header]
+            continue
+        # Skipping rows that don't match the header (e.g. pager rows)
+        if len(cells) != len(header):
+            continue
+        for col, value in zip(columns, cells):
+            col.append(value)
+    if header is None:
+        raise ValueError("CenteredGrid table has no rows")
+
+    df = pd.DataFrame({i: grid_column(col) for i, col in enumerate(columns)})
+    df.columns = header
+    return df
+
+def _is_grid(elem):
+    """
+    Private function that checks whether an element is the CenteredGrid table
+    """
+    return elem.tag == 'table' and 'CenteredGrid' in (elem.get('class') or '').split()
+
+def iter_grid_batches(chunks, batch_size=10000):
+    """
+    Incrementally parsing the CenteredGrid table from an iterable of html
+    chunks (e.g. a streamed response), yielding dataframes of at most
+    batch_size rows as soon as they are complete. Parsed rows are discarded
+    straight away, so memory use doesn't grow with the length of the table
+    """
+    parser = etree.HTMLPullParser(events=('start', 'end'))
+    header = None
+    columns = None
+    nrows = 0
+    # Depth of tables nested inside the grid (0 when outside it)
+    grid_depth = 0
+    found = False
+
+    def flush():
+        df = pd.DataFrame({i: grid_column(col) for i, col in enumerate(columns)})
+        df.columns = header
+        return df
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, elem in parser.read_events():
+            if elem.tag != 'table' and elem.tag != 'tr':
+                continue
+            if event == 'start':
+                if grid_depth > 0 and elem.tag == 'table':
+                    grid_depth += 1
+                elif _is_grid(elem):
+                    grid_depth = 1
+                    found = True
+                continue
+            # End events
+            if elem.tag == 'table' and grid_depth > 0:
+                grid_depth -= 1
+                continue
+            if grid_depth == 0:
+                continue
+            # A complete row of the grid
+            cells = row_cells(elem)
+            if header is None:
+                header = cells
+                columns = [[] for _ in header]
+            elif len(cells) == len(header):
+                for col, value in zip(columns, cells):
+                    col.append(value)
+                nrows += 1
+            # Discarding the row and any earlier siblings already processed
+            elem.clear()
+            parent = elem.getparent()
+            while parent is not None and elem.getprevious() is not None:
+                del parent[0]
+            if nrows >= batch_size:
+                yield flush()
+                columns = [[] for _ in header]
+                nrows = 0
+    parser.close()
+
+    if not found:
+        raise ValueError("No CenteredGrid table found in page")
+    if nrows > 0:
+        yield flush()
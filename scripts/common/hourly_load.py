@@ -0,0 +1,389 @@
+# Date: 17/10/2026
+
+# Description: Loading formatted station data into the hourly table from a
+# staging table, keyed on each reading (station, parameter and
+# timestamp): new readings are inserted, readings revised on the website are
+# updated (and logged in a revisions table) and unchanged readings are left
+# alone. The time of the latest stored reading of each station and parameter
+# is kept up to date in a high-water-mark table as data are loaded, and the
+# days touched by each load are recorded for the daily table
+
+from scripts.common.hourly_schema import ensure_hourly_schema, TS_EXPR, CODE_EXPR
+from scripts.common.daily_agg import ensure_daily_tables, pending_days_cte
+
+# Columns of formatted station data, in the order they are loaded into
+# staging tables
+HOURLY_COLS = ['STATION_NUMBER', 'STATION_NAME', 'Date', 'Time',
+               'Value', 'Parameter', 'Code', 'Comments']
+
+# Postgres type of each column of formatted station data
+HOURLY_COLUMN_TYPES = {
+    'STATION_NUMBER': 'text',
+    'STATION_NAME': 'text',
+    'Date': 'timestamp',
+    'Time': 'text',
+    'Value': 'float8',
+    'Parameter': 'text',
+    'Code': 'text',
+    'Comments': 'text',
+}
+
+# Columns identifying a single reading in the hourly table
+KEY_COLS = ['STATION_NUMBER', 'Parameter', 'ts']
+
+# Stored columns of the hourly table, and the expression computing each from
+# a staging table of formatted station data
+STORED_COLS = {
+    'STATION_NUMBER': '"STATION_NUMBER"',
+    'STATION_NAME': 'coalesce("STATION_NAME", \'\')',
+    'ts': TS_EXPR,
+    'Value': '"Value"',
+    'Parameter': '"Parameter"',
+    'Code': CODE_EXPR,
+    'Comments': 'coalesce("Comments", \'\')',
+}
+
+# Table holding the latest stored reading of each station and parameter
+HWM_TABLE = 'hourly_hwm'
+
+# Table logging every revision of a stored reading
+REVISIONS_TABLE = 'hourly_revisions'
+
+# Temporary table holding the de-duplicated readings being merged, in the
+# stored layout
+MERGE_TABLE = 'hourly_merge'
+
+def _quoted(cols):
+    """
+    Private function that quotes a list of column names for SQL
+    """
+    return ', '.join('"' + col + '"' for col in cols)
+
+def create_staging_table(cursor, staging='hourly_staging', column_types=HOURLY_COLUMN_TYPES):
+    """
+    Creating (if needed) and emptying a staging table for formatted station
+    data, private to this connection, with a column of each type in the spec.
+    Its rows are also removed on every commit
+    """
+    cursor.execute(
+        """
+        create temp table if not exists {} ({}) on commit delete rows
+        """.format(staging, ', '.join(
+            '"{}" {}'.format(col, pg_type) for col, pg_type in column_types.items()
+        ))
+    )
+    cursor.execute("truncate " + staging)
+
+def ensure_hwm_table(conn, schema):
+    """
+    Creating the high-water-mark table (the time of the latest stored reading
+    of each station and parameter) if it doesn't exist yet, filling it from
+    the hourly table
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("select to_regclass(%s)", (schema + '.' + HWM_TABLE,))
+        if cursor.fetchone()[0] is not None:
+            return False
+        print("Creating the high-water-mark table...")
+        cursor.execute(
+            """
+            create table {schema}.{hwm} (
+                "STATION_NUMBER" text not null,
+                "Parameter" text not null,
+                last_reading timestamp not null,
+                primary key ("STATION_NUMBER", "Parameter")
+            )
+            """.format(schema=schema, hwm=HWM_TABLE)
+        )
+        cursor.execute(
+            """
+            insert into {schema}.{hwm}
+            select "STATION_NUMBER", "Parameter", max(ts)
+            from {schema}.hourly
+            where "Value" is not null
+            group by "STATION_NUMBER", "Parameter"
+            """.format(schema=schema, hwm=HWM_TABLE)
+        )
+        conn.commit()
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def ensure_revisions_table(conn, schema):
+    """
+    Creating the revisions table (the old and new values of every stored
+    reading changed by a load) if it doesn't exist yet
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("select to_regclass(%s)", (schema + '.' + REVISIONS_TABLE,))
+        if cursor.fetchone()[0] is not None:
+            return False
+        print("Creating the revisions table...")
+        cursor.execute(
+            """
+            create table {schema}.{revisions} (
+                "STATION_NUMBER" text not null,
+                "Parameter" text not null,
+                ts timestamp not null,
+                old_value double precision,
+                new_value double precision,
+                old_code smallint,
+                new_code smallint,
+                revised_at timestamptz not null default now()
+            )
+            """.format(schema=schema, revisions=REVISIONS_TABLE)
+        )
+        cursor.execute(
+            """
+            create index {revisions}_key on {schema}.{revisions} ("STATION_NUMBER", "Parameter", ts)
+            """.format(schema=schema, revisions=REVISIONS_TABLE)
+        )
+        conn.commit()
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def ensure_hourly_tables(conn, schema):
+    """
+    Preparing the hourly table for loading: the table itself (with its
+    unique reading key and the partitions of the current years) and the
+    high-water-mark and revisions tables, and the daily tables its loads
+    record touched days for
+    """
+    ensure_hourly_schema(conn, schema)
+    ensure_hwm_table(conn, schema)
+    ensure_revisions_table(conn, schema)
+    ensure_daily_tables(conn, schema)
+
+def read_hwm(conn, schema):
+    """
+    Reading the high-water marks as a dictionary of the latest stored reading
+    time by (station, parameter)
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            'select "STATION_NUMBER", "Parameter", last_reading from {}.{}'.format(schema, HWM_TABLE)
+        )
+        hwm = {(station, param): last for station, param, last in cursor.fetchall()}
+    finally:
+        cursor.close()
+    conn.commit()
+    return hwm
+
+def clear_hwm(cursor, schema, station_id, params):
+    """
+    Removing the high-water marks of a station's parameters (e.g. when their
+    data are deleted to be re-loaded). The caller commits
+    """
+    cursor.execute(
+        """
+        delete from {}.{}
+        where "STATION_NUMBER" = %s and "Parameter" = any(%s)
+        """.format(schema, HWM_TABLE),
+        (station_id, list(params))
+    )
+
+def advance_hwm(cursor, schema, staging='hourly_staging'):
+    """
+    Moving each station and parameter's high-water mark forward to the latest
+    reading in a staging table. The caller commits
+    """
+    cursor.execute(
+        """
+        insert into {schema}.{hwm} as h
+        select "STATION_NUMBER", "Parameter", max({ts})
+        from {staging}
+        where "Value" is not null
+        group by "STATION_NUMBER", "Parameter"
+        on conflict ("STATION_NUMBER", "Parameter")
+        do update set last_reading = greatest(h.last_reading, excluded.last_reading)
+        """.format(schema=schema, hwm=HWM_TABLE, staging=staging, ts=TS_EXPR)
+    )
+
+def _stage_merge(cursor, staging):
+    """
+    Private function that converts the readings in a staging table to the
+    stored layout in the merge table, keeping the last copy of any reading
+    repeated within the staging table
+    """
+    cursor.execute("drop table if exists " + MERGE_TABLE)
+    cursor.execute(
+        """
+        create temp table {merge} on commit drop as
+        select distinct on ("STATION_NUMBER", "Parameter", {ts}) {exprs}
+        from {staging}
+        order by "STATION_NUMBER", "Parameter", {ts}, ctid desc
+        """.format(merge=MERGE_TABLE, staging=staging, ts=TS_EXPR,
+                   exprs=', '.join(expr + ' as "' + col + '"' for col, expr in STORED_COLS.items()))
+    )
+    return cursor.rowcount
+
+def _upsert_merge(cursor, schema):
+    """
+    Private function that applies the merge table to the hourly table. Stored
+    readings whose values differ are first logged in the revisions table and
+    then updated in bulk, new readings are inserted and unchanged readings
+    are skipped. Returns the numbers of inserted and updated rows
+    """
+    values = [col for col in STORED_COLS if col not in KEY_COLS]
+    stored = ', '.join('h."' + col + '"' for col in values)
+    merged = ', '.join('m."' + col + '"' for col in values)
+
+    # Logging the readings that are about to be revised
+    cursor.execute(
+        """
+        insert into {schema}.{revisions}
+            ("STATION_NUMBER", "Parameter", ts, old_value, new_value, old_code, new_code)
+        select h."STATION_NUMBER", h."Parameter", h.ts, h."Value", m."Value", h."Code", m."Code"
+        from {merge} m
+        join {schema}.hourly h
+        on h."STATION_NUMBER" = m."STATION_NUMBER"
+        and h."Parameter" = m."Parameter"
+        and h.ts = m.ts
+        where ({stored}) is distinct from ({merged})
+        """.format(schema=schema, revisions=REVISIONS_TABLE, merge=MERGE_TABLE,
+                   stored=stored, merged=merged)
+    )
+
+    # Inserting new readings and updating revised ones, recording the days
+    # they fall on for the daily table. xmax is 0 for rows inserted by this
+    # statement, and set for rows it updated
+    cursor.execute(
+        """
+        with upserted as (
+            insert into {schema}.hourly as h ({cols})
+            select {cols} from {merge}
+            on conflict ({key}) do update
+            set ({values}) = ({excluded})
+            where ({stored}) is distinct from ({excluded})
+            returning (h.xmax = 0) as inserted, h."STATION_NUMBER", h."Parameter", h.ts
+        ),
+        {pending}
+        select count(*) filter (where inserted), count(*) filter (where not inserted)
+        from upserted
+        """.format(
+            schema=schema, merge=MERGE_TABLE, cols=_quoted(STORED_COLS),
+            key=_quoted(KEY_COLS), values=_quoted(values), stored=stored,
+            excluded=', '.join('excluded."' + col + '"' for col in values),
+            pending=pending_days_cte(schema, 'upserted'),
+        )
+    )
+    inserted, updated = cursor.fetchone()
+    return inserted, updated
+
+def merge_staging(cursor, schema, staging='hourly_staging'):
+    """
+    Merging the readings in a staging table into the hourly table: new
+    readings are inserted, revised readings are logged and updated, and
+    readings already stored with the same values are left alone. The
+    high-water marks are moved forward. Returns the numbers of inserted,
+    updated and unchanged readings. The caller commits
+    """
+    nrows = _stage_merge(cursor, staging)
+    inserted, updated = _upsert_merge(cursor, schema)
+    advance_hwm(cursor, schema, staging)
+    return {'inserted': inserted, 'updated': updated, 'unchanged': nrows - inserted - updated}
+
+def replace_station_data(cursor, schema, station_id, staging='hourly_staging'):
+    """
+    Replacing a station's stored data with the readings in a staging table,
+    for every parameter present in it, without emptying the station first:
+    readings missing from the staging table are deleted, then the staging
+    table is merged as in merge_staging (so only new and revised readings are
+    written). Run in one transaction this never leaves the station empty, and
+    unchanged history leaves no dead tuples. Returns the numbers of deleted,
+    inserted, updated and unchanged readings. The caller commits
+    """
+    # Parameters present in the staging table
+    cursor.execute('select distinct "Parameter" from ' + staging)
+    params = [row[0] for row in cursor.fetchall()]
+    if len(params) == 0:
+        return {'deleted': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0}
+
+    nrows = _stage_merge(cursor, staging)
+    # Deleting stored readings that aren't in the staging table, recording
+    # the days they fell on for the daily table
+    cursor.execute(
+        """
+        with deleted as (
+            delete from {schema}.hourly h
+            where h."STATION_NUMBER" = %s
+            and h."Parameter" = any(%s)
+            and not exists (
+                select 1 from {merge} m
+                where m."STATION_NUMBER" = h."STATION_NUMBER"
+                and m."Parameter" = h."Parameter"
+                and m.ts = h.ts
+            )
+            returning h."STATION_NUMBER", h."Parameter", h.ts
+        ),
+        {pending}
+        select count(*) from deleted
+        """.format(schema=schema, merge=MERGE_TABLE, pending=pending_days_cte(schema, 'deleted')),
+        (station_id, params)
+    )
+    deleted = cursor.fetchone()[0]
+    inserted, updated = _upsert_merge(cursor, schema)
+
+    # Resetting the station's high-water marks to the latest staged readings
+    clear_hwm(cursor, schema, station_id, params)
+    advance_hwm(cursor, schema, staging)
+    return {'deleted': deleted, 'inserted': inserted, 'updated': updated,
+            'unchanged': nrows - inserted - updated}
+
+def replace_spans(cursor, schema, station_id, spans, staging='hourly_staging'):
+    """
+    Replacing a station's stored data within a set of time spans (tuples of
+    parameter, first and last timestamp, e.g. the readings covered by each of
+    a set of pages) with the readings in a staging table: stored readings
+    inside a span that are missing from the staging table are deleted, then
+    the staging table is merged as in merge_staging. Readings outside every
+    span are left alone. Returns the numbers of deleted, inserted, updated
+    and unchanged readings. The caller commits
+    """
+    if len(spans) == 0:
+        return {'deleted': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0}
+    params, starts, ends = (list(col) for col in zip(*spans))
+
+    nrows = _stage_merge(cursor, staging)
+    # Deleting stored readings inside a span that aren't in the staging
+    # table, recording the days they fell on for the daily table
+    cursor.execute(
+        """
+        with spans as (
+            select * from unnest(%s::text[], %s::timestamp[], %s::timestamp[])
+            as s("Parameter", span_start, span_end)
+        ),
+        deleted as (
+            delete from {schema}.hourly h
+            using spans s
+            where h."STATION_NUMBER" = %s
+            and h."Parameter" = s."Parameter"
+            and h.ts between s.span_start and s.span_end
+            and not exists (
+                select 1 from {merge} m
+                where m."STATION_NUMBER" = h."STATION_NUMBER"
+                and m."Parameter" = h."Parameter"
+                and m.ts = h.ts
+            )
+            returning h."STATION_NUMBER", h."Parameter", h.ts
+        ),
+        {pending}
+        select count(*) from deleted
+        """.format(schema=schema, merge=MERGE_TABLE, pending=pending_days_cte(schema, 'deleted')),
+        (params, starts, ends, station_id)
+    )
+    deleted = cursor.fetchone()[0]
+    inserted, updated = _upsert_merge(cursor, schema)
+    advance_hwm(cursor, schema, staging)
+    return {'deleted': deleted, 'inserted': inserted, 'updated': updated,
+            'unchanged': nrows - inserted - updated}
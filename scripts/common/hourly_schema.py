@@ -0,0 +1,246 @@
+# Date: 17/10/2026
+
+# Description: DDL for the hourly table. Readings are stored with a single
+# timestamp column (ts) and a smallint estimate code, indexed with a B-tree on
+# (station, parameter, ts) and a BRIN index on ts, and partitioned by year on
+# ts (with a default partition for anything outside the yearly partitions).
+# The Date and Time columns of the original layout are kept as generated
+# columns so existing queries keep working. hourly_recent is a view of the
+# last year of readings, answered from the latest partitions only
+
+from datetime import datetime
+
+# First year given its own partition. Readings before it go to the default
+# partition
+FIRST_PARTITION_YEAR = 2000
+
+# Names of the indexes on the hourly table
+KEY_INDEX = 'hourly_reading_key'
+TS_BRIN_INDEX = 'hourly_ts_brin'
+
+# Default partition, holding readings outside every yearly partition
+DEFAULT_PARTITION = 'hourly_default'
+
+# View of the most recent readings, and the number of days it covers
+RECENT_VIEW = 'hourly_recent'
+RECENT_DAYS = 366
+
+# Expressions converting the columns of formatted station data (split
+# Date/Time and a text estimate code) to the stored timestamp and code
+TS_EXPR = '"Date" + "Time"::interval'
+CODE_EXPR = """case when btrim("Code") ~ '^-?[0-9]+(\\.0*)?$' then btrim("Code")::numeric::smallint end"""
+
+def hourly_ddl(schema):
+    """
+    Getting the statement creating the (partitioned) hourly table
+    """
+    return """
+        create table {schema}.hourly (
+            "STATION_NUMBER" text not null,
+            "STATION_NAME" text not null default '',
+            ts timestamp not null,
+            "Date" timestamp generated always as (date_trunc('day', ts)) stored,
+            "Time" text generated always as ((ts::time)::text) stored,
+            "Value" double precision,
+            "Parameter" text not null,
+            "Code" smallint,
+            "Comments" text not null default ''
+        ) partition by range (ts)
+        """.format(schema=schema)
+
+def hourly_index_ddl(schema):
+    """
+    Getting the statements creating the indexes of the hourly table: a unique
+    B-tree on the reading key, which serves per-station lookups, deletes and
+    conflict checks, and a BRIN index on ts for range scans across stations
+    """
+    return [
+        """
+        create unique index {key} on {schema}.hourly ("STATION_NUMBER", "Parameter", ts)
+        """.format(key=KEY_INDEX, schema=schema),
+        """
+        create index {brin} on {schema}.hourly using brin (ts)
+        """.format(brin=TS_BRIN_INDEX, schema=schema),
+    ]
+
+def partition_name(year):
+    """
+    Getting the name of the partition holding a year's readings
+    """
+    return 'hourly_y' + str(year)
+
+def hourly_layout(cursor, schema):
+    """
+    Checking which layout the hourly table has: 'missing' if it doesn't exist,
+    'legacy' for the original text Date/Time layout (which needs migrating
+    with scripts/reset/04_pacfish_migrate_hourly_schema.py) or 'current'
+    """
+    cursor.execute(
+        """
+        select column_name from information_schema.columns
+        where table_schema = %s and table_name = 'hourly'
+        """,
+        (schema,)
+    )
+    cols = {row[0] for row in cursor.fetchall()}
+    if len(cols) == 0:
+        return 'missing'
+    return 'current' if 'ts' in cols else 'legacy'
+
+def existing_partitions(cursor, schema):
+    """
+    Getting the names of the partitions of the hourly table
+    """
+    cursor.execute(
+        """
+        select c.relname
+        from pg_inherits i
+        join pg_class c on c.oid = i.inhrelid
+        join pg_class p on p.oid = i.inhparent
+        join pg_namespace n on n.oid = p.relnamespace
+        where n.nspname = %s and p.relname = 'hourly'
+        """,
+        (schema,)
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+def ensure_partitions(cursor, schema, first_year=FIRST_PARTITION_YEAR, last_year=None):
+    """
+    Creating the default partition and the yearly partitions from first_year
+    to last_year (next year by default) that don't exist yet. Readings of a
+    new year already in the default partition are moved into the new
+    partition. Returns the names of the partitions created. The caller commits
+    """
+    if last_year is None:
+        last_year = datetime.now().year + 1
+    existing = existing_partitions(cursor, schema)
+    created = []
+    if DEFAULT_PARTITION not in existing:
+        cursor.execute(
+            'create table {schema}.{part} partition of {schema}.hourly default'.format(
+                schema=schema, part=DEFAULT_PARTITION
+            )
+        )
+        created.append(DEFAULT_PARTITION)
+    for year in range(first_year, last_year + 1):
+        part = partition_name(year)
+        if part in existing:
+            continue
+        bounds = (datetime(year, 1, 1), datetime(year + 1, 1, 1))
+        # Moving this year's readings out of the default partition, since the
+        # partition can't be created while the default one holds them
+        cursor.execute(
+            """
+            create temp table hourly_moved on commit drop as
+            select "STATION_NUMBER", "STATION_NAME", ts, "Value", "Parameter", "Code", "Comments"
+            from {schema}.{default}
+            where ts >= %s and ts < %s
+            """.format(schema=schema, default=DEFAULT_PARTITION),
+            bounds
+        )
+        cursor.execute(
+            'delete from {}.{} where ts >= %s and ts < %s'.format(schema, DEFAULT_PARTITION),
+            bounds
+        )
+        cursor.execute(
+            """
+            create table {schema}.{part} partition of {schema}.hourly
+            for values from (%s) to (%s)
+            """.format(schema=schema, part=part),
+            bounds
+        )
+        cursor.execute(
+            """
+            insert into {schema}.hourly ("STATION_NUMBER", "STATION_NAME", ts, "Value", "Parameter", "Code", "Comments")
+            select * from hourly_moved
+            """.format(schema=schema)
+        )
+        cursor.execute('drop table hourly_moved')
+        created.append(part)
+    return created
+
+def drop_recent_view(cursor, schema):
+    """
+    Dropping hourly_recent, whether it is the view or a table created by the
+    original R script. The caller commits
+    """
+    cursor.execute(
+        """
+        select c.relkind from pg_class c
+        join pg_namespace n on n.oid = c.relnamespace
+        where n.nspname = %s and c.relname = %s
+        """,
+        (schema, RECENT_VIEW)
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return
+    kind = 'view' if row[0] == 'v' else 'table'
+    cursor.execute('drop {} {}.{}'.format(kind, schema, RECENT_VIEW))
+
+def recent_view_exists(cursor, schema):
+    """
+    Checking whether hourly_recent exists as a view
+    """
+    cursor.execute(
+        "select 1 from information_schema.views where table_schema = %s and table_name = %s",
+        (schema, RECENT_VIEW)
+    )
+    return cursor.fetchone() is not None
+
+def ensure_recent_view(cursor, schema):
+    """
+    Creating the hourly_recent view of the readings from the last RECENT_DAYS
+    days, replacing the table rebuilt on every run by the original R script.
+    Since current_date is fixed for the duration of a query, the yearly
+    partitions outside the window are pruned when the view is queried, so it
+    reads only the latest one or two partitions and is always current. The
+    caller commits
+    """
+    drop_recent_view(cursor, schema)
+    cursor.execute(
+        """
+        create view {schema}.{view} as
+        select * from {schema}.hourly
+        where ts >= current_date - {days}
+        """.format(schema=schema, view=RECENT_VIEW, days=RECENT_DAYS)
+    )
+
+def create_hourly_table(cursor, schema, first_year=FIRST_PARTITION_YEAR, last_year=None):
+    """
+    Creating the empty hourly table with its indexes and partitions. The
+    caller commits
+    """
+    cursor.execute(hourly_ddl(schema))
+    for statement in hourly_index_ddl(schema):
+        cursor.execute(statement)
+    ensure_partitions(cursor, schema, first_year, last_year)
+    ensure_recent_view(cursor, schema)
+
+def ensure_hourly_schema(conn, schema):
+    """
+    Making sure the hourly table exists with the current layout, creating it
+    if missing and adding the partitions of any new years. Raises an error if
+    the table still has the legacy layout
+    """
+    cursor = conn.cursor()
+    try:
+        layout = hourly_layout(cursor, schema)
+        if layout == 'legacy':
+            raise RuntimeError(
+                "The hourly table has the legacy Date/Time layout - migrate it first with "
+                "scripts/reset/04_pacfish_migrate_hourly_schema.py"
+            )
+        if layout == 'missing':
+            print("Creating the hourly table...")
+            create_hourly_table(cursor, schema)
+        else:
+            ensure_partitions(cursor, schema)
+            if not recent_view_exists(cursor, schema):
+                ensure_recent_view(cursor, schema)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
@@ -0,0 +1,186 @@
+# Date: 16/10/2026
+
+# Description: A shared HTTP client for all download scripts, which reuses
+# pooled keep-alive connections, applies per-request and whole-run time
+# limits, retries transient failures with jittered exponential backoff and
+# records the latency of every request
+
+import random
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from scripts.common.rate_limiter import AdaptiveRateLimiter
+
+# Status codes that indicate a transient server-side problem worth retrying
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """
+    Raised when a request is attempted after the whole-run deadline has passed
+    """
+
+class HttpClient:
+    """
+    Pooled, thread-safe HTTP client. A single instance should be shared by
+    everything that downloads pages during a run
+    """
+    def __init__(self, pool_size=10, connect_timeout=10, read_timeout=60,
+                 run_deadline=None, max_retries=3, backoff_base=0.5, backoff_cap=30,
+                 limiter=None):
+        # Session whose connection pool is large enough for all download threads
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # Time limits (in seconds)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.deadline = (
+            None if run_deadline is None
+            else time.monotonic() + run_deadline
+        )
+        # Retry settings
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        # Optional AdaptiveRateLimiter that paces requests to each host
+        self.limiter = limiter
+        # Latency records as (method, url, status, seconds, attempt) tuples. The
+        # status is None where the request failed without a response
+        self.latencies = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_options(cls, opts, deadline_key='run_deadline', pool_size=None):
+        """
+        Creating a client from the settings in options/fetch.json, taking the
+        whole-run deadline from deadline_key (e.g. reset_run_deadline for the
+        reset scripts, whose runs are much longer than an update). The
+        connection pool holds max_concurrency connections unless pool_size
+        is given (e.g. for the concurrency of a reset)
+        """
+        if pool_size is None:
+            pool_size = opts.get('pool_size', opts.get('max_concurrency', 10))
+        return cls(
+            pool_size=pool_size,
+            connect_timeout=opts.get('connect_timeout', 10),
+            read_timeout=opts.get('read_timeout', 60),
+            run_deadline=opts.get(deadline_key),
+            max_retries=opts.get('max_retries', 3),
+            backoff_base=opts.get('backoff_base', 0.5),
+            backoff_cap=opts.get('backoff_cap', 30),
+            limiter=(
+                AdaptiveRateLimiter.from_options(opts['rate_limit'])
+                if opts.get('rate_limit') is not None else None
+            ),
+        )
+
+    def remaining(self):
+        """
+        Seconds left before the whole-run deadline (None if there isn't one)
+        """
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def _timeout(self):
+        """
+        Private method that gets the (connect, read) timeout for the next
+        attempt, shortened so that it never runs past the run deadline
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return (self.connect_timeout, self.read_timeout)
+        if remaining <= 0:
+            raise DeadlineExceeded("Run deadline exceeded")
+        return (min(self.connect_timeout, remaining), min(self.read_timeout, remaining))
+
+    def _backoff(self, attempt):
+        """
+        Private method that sleeps before a retry, using exponential backoff
+        with full jitter
+        """
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        remaining = self.remaining()
+        if remaining is not None:
+            delay = min(delay, max(remaining, 0))
+        time.sleep(delay)
+
+    def _record(self, method, url, status, seconds, attempt):
+        """
+        Private method that stores the latency of a single attempt, and passes
+        its outcome to the rate limiter
+        """
+        with self._lock:
+            self.latencies.append((method, url, status, seconds, attempt))
+        if self.limiter is not None:
+            ok = status is not None and status not in RETRY_STATUSES
+            self.limiter.record(urlsplit(url).netloc, seconds, ok)
+
+    def request(self, method, url, **kwargs):
+        """
+        Sending a request, retrying connection errors, timeouts and transient
+        server errors. Once retries are exhausted the last response is returned
+        (or the last error raised)
+        """
+        host = urlsplit(url).netloc
+        for attempt in range(self.max_retries + 1):
+            # Waiting for the rate limiter, but never past the run deadline
+            if self.limiter is not None and not self.limiter.acquire(host, self.remaining()):
+                raise DeadlineExceeded("Run deadline exceeded")
+            timeout = self._timeout()
+            start = time.monotonic()
+            try:
+                resp = self.session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self._record(method, url, None, time.monotonic() - start, attempt)
+                # Giving up on the last attempt
+                if attempt == self.max_retries:
+                    raise
+            else:
+                self._record(method, url, resp.status_code, time.monotonic() - start, attempt)
+                if resp.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    return resp
+                # Releasing the connection back to the pool before retrying
+                resp.close()
+            self._backoff(attempt)
+
+    def get(self, url, **kwargs):
+        """
+        Sending a GET request
+        """
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        """
+        Sending a POST request
+        """
+        return self.request('POST', url, data=data, **kwargs)
+
+    def latency_summary(self):
+        """
+        Summarising request latencies for the run report
+        """
+        with self._lock:
+            records = list(self.latencies)
+        seconds = sorted(rec[3] for rec in records)
+        if len(seconds) == 0:
+            return {'requests': 0}
+        return {
+            'requests': len(records),
+            'retries': sum(1 for rec in records if rec[4] > 0),
+            'failures': sum(1 for rec in records if rec[2] is None or rec[2] in RETRY_STATUSES),
+            'mean_s': round(statistics.fmean(seconds), 3),
+            'median_s': round(statistics.median(seconds), 3),
+            'p95_s': round(seconds[int(0.95 * (len(seconds) - 1))], 3),
+            'max_s': round(seconds[-1], 3),
+        }
+
+    def rate_summary(self):
+        """
+        Current rate limiter state by host for the run report
+        """
+        return {} if self.limiter is None else self.limiter.stats()
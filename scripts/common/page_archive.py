@@ -0,0 +1,127 @@
+# Date: 16/10/2026
+
+# Description: A content-addressed, zstd-compressed archive of every station
+# page downloaded by the scrapers, so that the data can be re-parsed and
+# re-loaded later without going back to the website
+
+import hashlib
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+import zstandard
+
+def read_blob(root, digest):
+    """
+    Reading and decompressing a single archived page. This is a plain function
+    so that it can be called from worker processes
+    """
+    path = Path(root) / 'blobs' / digest[:2] / (digest + '.html.zst')
+    with open(path, 'rb') as f:
+        # Pages archived while streaming have no content size in their header,
+        # so a streaming decompressor is used for every page
+        return zstandard.ZstdDecompressor().decompressobj().decompress(f.read())
+
+class PageArchive:
+    """
+    Archive of raw page html, stored once per unique page under its SHA-256
+    digest, with an index of which station, variable and fetch time each
+    page belongs to
+    """
+    def __init__(self, root, level=10):
+        self.root = Path(root)
+        self.level = level
+        self.index_path = self.root / 'index.jsonl'
+        self._lock = threading.Lock()
+
+    def store(self, content, station, variable, source, fetched=None):
+        """
+        Storing a page's raw html (bytes or str) and recording it in the index.
+        Returns the page's digest
+        """
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.root / 'blobs' / digest[:2] / (digest + '.html.zst')
+        # Identical pages are only written once
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.tmp.' + str(threading.get_ident()))
+            with open(tmp_path, 'wb') as f:
+                f.write(zstandard.ZstdCompressor(level=self.level).compress(content))
+            os.replace(tmp_path, path)
+        # Appending a line to the index
+        self._append_entry(station, variable, source, digest, fetched)
+        return digest
+
+    def store_stream(self, chunks, station, variable, source, fetched=None):
+        """
+        Archiving a page while it is being downloaded. Wraps an iterable of
+        html chunks (e.g. a streamed response), compressing each chunk to a
+        temporary file as it passes through. The page is only added to the
+        archive (and the index) once every chunk has been read
+        """
+        fetched = fetched or datetime.now()
+        tmp_dir = self.root / 'blobs'
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = tmp_dir / ('stream.tmp.' + uuid.uuid4().hex)
+        sha = hashlib.sha256()
+        try:
+            with open(tmp_path, 'wb') as f:
+                with zstandard.ZstdCompressor(level=self.level).stream_writer(f, closefd=False) as writer:
+                    for chunk in chunks:
+                        sha.update(chunk)
+                        writer.write(chunk)
+                        yield chunk
+            digest = sha.hexdigest()
+            path = self.root / 'blobs' / digest[:2] / (digest + '.html.zst')
+            # Identical pages are only written once
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_path, path)
+            self._append_entry(station, variable, source, digest, fetched)
+        finally:
+            # Cleaning up after a duplicate or an interrupted download
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def _append_entry(self, station, variable, source, digest, fetched=None):
+        """
+        Private method that appends a line to the index
+        """
+        entry = {
+            'station': station,
+            'variable': variable,
+            'fetched': (fetched or datetime.now()).isoformat(timespec='seconds'),
+            'source': source,
+            'digest': digest,
+        }
+        with self._lock:
+            with open(self.index_path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+    def entries(self, stations=None, since=None, until=None):
+        """
+        Reading index entries, optionally filtered to a set of station url
+        names and a range of fetch dates (as YYYY-MM-DD strings). Entries are
+        returned in order of fetch time
+        """
+        if not self.index_path.exists():
+            return []
+        with open(self.index_path) as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        if stations is not None:
+            entries = [e for e in entries if e['station'] in stations]
+        if since is not None:
+            entries = [e for e in entries if e['fetched'][:10] >= since]
+        if until is not None:
+            entries = [e for e in entries if e['fetched'][:10] <= until]
+        return sorted(entries, key=lambda e: e['fetched'])
+
+    def read(self, digest):
+        """
+        Reading a single archived page by digest
+        """
+        return read_blob(self.root, digest)
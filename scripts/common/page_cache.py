@@ -0,0 +1,99 @@
+# Date: 16/10/2026
+
+# Description: An on-disk cache of the ETag/Last-Modified headers and data
+# table hash of each station page, used to send conditional requests and skip
+# pages that haven't changed since they were last loaded
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from scripts.common.grid_parser import find_centered_grid, row_cells
+
+def grid_hash(content):
+    """
+    Hashing the cells of every row of a page's CenteredGrid data table (found
+    the same way it is parsed), so that changes to the surrounding form state
+    or markup don't count as changes. Pages without the table are hashed
+    whole
+    """
+    table = find_centered_grid(content)
+    if table is None:
+        return hashlib.sha256(content).hexdigest()
+    digest = hashlib.sha256()
+    for row in table.iter('tr'):
+        digest.update('\t'.join(row_cells(row)).encode('utf-8') + b'\n')
+    return digest.hexdigest()
+
+class PageCache:
+    """
+    Cache of response validators and content hashes, keyed by page url
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        # Reading the existing cache if there is one
+        if self.path.exists():
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        else:
+            self.entries = {}
+        self._lock = threading.Lock()
+
+    def conditional_headers(self, url):
+        """
+        Getting the If-None-Match/If-Modified-Since headers for a url
+        """
+        with self._lock:
+            entry = self.entries.get(url, {})
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def get(self, client, url, **kwargs):
+        """
+        Sending a conditional GET request for a url through the client
+        """
+        headers = {**kwargs.pop('headers', {}), **self.conditional_headers(url)}
+        return client.get(url, headers=headers, **kwargs)
+
+    def is_unchanged(self, url, resp):
+        """
+        Checking whether a response is unchanged since the page was last stored,
+        either because the server said so (304) or because the data table hash
+        matches
+        """
+        if resp.status_code == 304:
+            return True
+        with self._lock:
+            entry = self.entries.get(url)
+        return entry is not None and entry.get('hash') == grid_hash(resp.content)
+
+    def store(self, url, resp):
+        """
+        Recording a response's validators and hash. This should only be called
+        once the page's data have been loaded successfully
+        """
+        with self._lock:
+            # A 304 carries no body, so the previous hash is kept
+            entry = self.entries.get(url, {})
+            if resp.status_code != 304:
+                entry['hash'] = grid_hash(resp.content)
+            entry['etag'] = resp.headers.get('ETag', entry.get('etag'))
+            entry['last_modified'] = resp.headers.get('Last-Modified', entry.get('last_modified'))
+            self.entries[url] = entry
+
+    def save(self):
+        """
+        Writing the cache to disk (via a temporary file, so that an interrupted
+        write can't corrupt the existing cache)
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        with self._lock:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.entries, f, indent=1)
+        os.replace(tmp_path, self.path)
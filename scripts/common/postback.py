@@ -0,0 +1,182 @@
+# Date: 16/10/2026
+
+# Description: A plain-HTTP client for the date-picker form on Pacfish station
+# pages. The ASP.NET form state (__VIEWSTATE, __EVENTVALIDATION etc.) is read
+# from the page and posted back with the requested date range, replacing the
+# browser automation previously needed to submit the form
+
+import re
+from datetime import datetime
+from bs4 import BeautifulSoup, SoupStrainer
+
+# Element ids of the form controls on station pages
+START_PICKER_ID = 'ContentPlaceHolder1_DateTimePicker'
+END_PICKER_ID = 'ContentPlaceHolder1_DateTimePicker2'
+SUBMIT_ID = 'ContentPlaceHolder1_Button1'
+
+# Format used by the date-picker text boxes
+DATE_FORMAT = '%b %d, %Y %H:%M'
+
+class NoDataTable(ValueError):
+    """
+    Raised when the form submissions for a date range return no data table
+    """
+
+# Opening tag of the data table, for pages as bytes and as str
+_GRID_TAG = re.compile(
+    rb"""<table\b[^>]*\bclass\s*=\s*["']?[^"'>]*\bCenteredGrid\b""", re.IGNORECASE
+)
+_GRID_TAG_STR = re.compile(_GRID_TAG.pattern.decode('ascii'), re.IGNORECASE)
+
+# Input types that are only submitted when they are the control being clicked
+_BUTTON_TYPES = {'submit', 'button', 'image', 'reset'}
+
+def parse_form_state(html):
+    """
+    Reading the form fields from a station page. Returns a dictionary of the
+    values that a browser would submit, and a dictionary of (name, value) pairs
+    for every control with an id
+    """
+    # Only input elements are parsed, rather than the whole page
+    inputs = BeautifulSoup(html, 'html.parser', parse_only=SoupStrainer('input'))
+    fields = {}
+    controls = {}
+    for inp in inputs.find_all('input'):
+        name = inp.get('name')
+        if name is None:
+            continue
+        value = inp.get('value', '')
+        input_type = inp.get('type', 'text').lower()
+        if inp.get('id') is not None:
+            controls[inp['id']] = (name, value)
+        # Skipping buttons and unchecked boxes, which browsers don't submit
+        if input_type in _BUTTON_TYPES:
+            continue
+        if input_type in ('checkbox', 'radio') and not inp.has_attr('checked'):
+            continue
+        fields[name] = value
+    # Checking that this is actually a postback form
+    if '__VIEWSTATE' not in fields:
+        raise ValueError("Page has no ASP.NET form state (__VIEWSTATE)")
+    return fields, controls
+
+def format_picker_date(date):
+    """
+    Formatting a datetime (or passing through a string) for the date-picker
+    """
+    return date if isinstance(date, str) else date.strftime(DATE_FORMAT)
+
+def build_date_range_form(html, start_date=None, end_date=None):
+    """
+    Building the form data that submits a date range from a station page. A
+    date left as None keeps the value currently in the page's date-picker
+    """
+    fields, controls = parse_form_state(html)
+    if start_date is not None:
+        fields[controls[START_PICKER_ID][0]] = format_picker_date(start_date)
+    if end_date is not None:
+        fields[controls[END_PICKER_ID][0]] = format_picker_date(end_date)
+    # Submitting the form as if the button was clicked
+    button_name, button_value = controls[SUBMIT_ID]
+    fields[button_name] = button_value
+    return fields
+
+def has_data_table(content):
+    """
+    Checking whether a page (or the start of one) contains the opening tag of
+    the CenteredGrid data table, so that other mentions of the class (e.g. in
+    a stylesheet or script) don't count
+    """
+    pattern = _GRID_TAG if isinstance(content, bytes) else _GRID_TAG_STR
+    return pattern.search(content) is not None
+
+def read_picker_dates(html):
+    """
+    Reading the current start and end values of the date-pickers on a page as
+    datetimes
+    """
+    _, controls = parse_form_state(html)
+    dates = []
+    for picker_id in (START_PICKER_ID, END_PICKER_ID):
+        value = controls[picker_id][1]
+        try:
+            dates.append(datetime.strptime(value, '%b %d, %Y %I:%M %p'))
+        except ValueError:
+            dates.append(datetime.strptime(value, DATE_FORMAT))
+    return tuple(dates)
+
+def read_first_reading_date(client, url, page=None, earliest=datetime(2000, 1, 1)):
+    """
+    Getting the date of the first reading on a station page. The form is
+    posted with a start date of earliest (keeping the page's end date), and
+    if that is earlier than the first reading the server resets the start
+    date-picker to it. Returns earliest if the server accepts it
+    """
+    if page is None:
+        resp = client.get(url)
+        resp.raise_for_status()
+        page = resp.content
+    resp = client.post(url, data=build_date_range_form(page, earliest))
+    resp.raise_for_status()
+    return max(read_picker_dates(resp.content)[0], earliest)
+
+def fetch_date_range(client, url, start_date, end_date=None, page=None, max_posts=2):
+    """
+    Requesting the data for a date range from a station page. The page is
+    downloaded first unless its html is passed in as page (e.g. a response
+    cached by the link validation). If the start date is earlier than the
+    station's first reading the server returns no table but resets the
+    date-picker to the first reading, so the form is posted again with the
+    corrected start date (keeping the requested end date). Returns the
+    response containing the data table
+    """
+    if page is None:
+        resp = client.get(url)
+        resp.raise_for_status()
+        page = resp.content
+    for i in range(max_posts):
+        form = build_date_range_form(page, start_date, end_date)
+        resp = client.post(url, data=form)
+        resp.raise_for_status()
+        if has_data_table(resp.content):
+            return resp
+        # Re-posting with the start date the server filled in
+        page = resp.content
+        start_date = None
+    raise NoDataTable("No data table returned after " + str(max_posts) + " form submissions")
+
+def stream_date_range(client, url, start_date, end_date=None, page=None,
+                      max_posts=2, chunk_size=65536):
+    """
+    Streaming version of fetch_date_range for very large pages (e.g. a
+    station's full archive). Yields the html of the response containing the
+    data table in chunks as it arrives, rather than reading the whole
+    response into memory. Only the start of each response is held, until the
+    data table is found
+    """
+    if page is None:
+        resp = client.get(url)
+        resp.raise_for_status()
+        page = resp.content
+    for i in range(max_posts):
+        form = build_date_range_form(page, start_date, end_date)
+        resp = client.post(url, data=form, stream=True)
+        try:
+            resp.raise_for_status()
+            chunks = resp.iter_content(chunk_size)
+            # Reading until the data table starts (or the response ends)
+            head = b''
+            for chunk in chunks:
+                head += chunk
+                if has_data_table(head):
+                    break
+            if has_data_table(head):
+                yield head
+                yield from chunks
+                return
+        finally:
+            resp.close()
+        # Re-posting with the start date the server filled in
+        page = head
+        start_date = None
+    raise NoDataTable("No data table returned after " + str(max_posts) + " form submissions")
@@ -0,0 +1,139 @@
+# Date: 17/10/2026
+
+# Description: A per-host token-bucket rate limiter whose rate adapts to the
+# server's health - backing off on server errors and timeouts, holding steady
+# on slow responses, and speeding back up while responses are healthy
+
+import threading
+import time
+from collections import deque
+
+class _HostBucket:
+    """
+    Private token bucket and health record for a single host
+    """
+    def __init__(self, rate, burst, window):
+        self.rate = rate
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.last_decrease = 0.0
+        self.waiting = 0
+        # Recent (latency, ok) outcomes
+        self.outcomes = deque(maxlen=window)
+
+class AdaptiveRateLimiter:
+    """
+    Thread-safe politeness scheduler shared by every request in a run. Each
+    host gets a token bucket refilled at its current rate (requests/second).
+    The rate grows additively while responses are healthy and fast, is held
+    while latency exceeds the target, and is cut multiplicatively on errors
+    """
+    def __init__(self, initial_rate=4.0, min_rate=0.5, max_rate=20.0, burst=4,
+                 target_latency=2.0, increase=1.0, decrease=0.5, cooldown=1.0,
+                 window=50):
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.target_latency = target_latency
+        self.increase = increase
+        self.decrease = decrease
+        # Minimum number of seconds between two rate cuts, so that a burst of
+        # failures from requests already in flight only counts once
+        self.cooldown = cooldown
+        self.window = window
+        self._buckets = {}
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_options(cls, opts):
+        """
+        Creating a limiter from the 'rate_limit' settings in options/fetch.json
+        """
+        return cls(**opts)
+
+    def _bucket(self, host):
+        """
+        Private method that gets (or creates) the bucket for a host. Must be
+        called while holding the lock
+        """
+        if host not in self._buckets:
+            self._buckets[host] = _HostBucket(self.initial_rate, self.burst, self.window)
+        return self._buckets[host]
+
+    def _refill(self, bucket):
+        """
+        Private method that adds the tokens earned since the last refill
+        """
+        now = time.monotonic()
+        bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * bucket.rate)
+        bucket.updated = now
+
+    def acquire(self, host, timeout=None):
+        """
+        Waiting for permission to send a request to a host. Returns False if
+        no token became available within the timeout (in seconds)
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            bucket = self._bucket(host)
+            bucket.waiting += 1
+            try:
+                while True:
+                    self._refill(bucket)
+                    if bucket.tokens >= 1:
+                        bucket.tokens -= 1
+                        return True
+                    # Sleeping until the next token is due (or the rate changes)
+                    wait = (1 - bucket.tokens) / bucket.rate
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                        wait = min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                bucket.waiting -= 1
+
+    def record(self, host, latency, ok):
+        """
+        Recording the outcome of a request and adapting the host's rate. ok
+        should be False for server errors (429/5xx), timeouts and connection
+        errors
+        """
+        with self._cond:
+            bucket = self._bucket(host)
+            bucket.outcomes.append((latency, ok))
+            now = time.monotonic()
+            if not ok:
+                # Multiplicative decrease, at most once per cooldown period
+                if now - bucket.last_decrease >= self.cooldown:
+                    bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+                    bucket.last_decrease = now
+            elif latency <= self.target_latency:
+                # Additive increase, spread over roughly one second of requests.
+                # Slow responses leave the rate unchanged
+                bucket.rate = min(self.max_rate, bucket.rate + self.increase / bucket.rate)
+            self._cond.notify_all()
+
+    def stats(self):
+        """
+        Current rate, queue depth and recent health of every host
+        """
+        with self._cond:
+            out = {}
+            for host, bucket in self._buckets.items():
+                outcomes = list(bucket.outcomes)
+                out[host] = {
+                    'rate': round(bucket.rate, 2),
+                    'queue_depth': bucket.waiting,
+                    'error_rate': (
+                        round(sum(1 for o in outcomes if not o[1]) / len(outcomes), 3)
+                        if len(outcomes) > 0 else None
+                    ),
+                    'mean_latency_s': (
+                        round(sum(o[0] for o in outcomes) / len(outcomes), 3)
+                        if len(outcomes) > 0 else None
+                    ),
+                }
+            return out
@@ -0,0 +1,274 @@
+# Date: 17/10/2026
+
+# Description: A rollup engine computing summary tables of the hourly data at
+# several resolutions (e.g. daily, monthly and annual) in a single ordered
+# scan of the hourly table. Readings are aggregated with vectorized numpy
+# reductions over blocks of whole station/parameter series, and each level is
+# written to its own table. Levels and statistics are set in
+# options/rollups.json
+
+import numpy as np
+import pandas as pd
+from scripts.common.bulk_loader import copy_frames
+
+# numpy datetime unit of each supported period length
+PERIOD_UNITS = {
+    'day': 'D',
+    'month': 'M',
+    'year': 'Y',
+}
+
+# Supported statistics, and the column and Postgres type each is stored as.
+# Percentiles are configured separately
+STATISTICS = {
+    'min': ('value_min', 'float8'),
+    'max': ('value_max', 'float8'),
+    'mean': ('value_mean', 'float8'),
+    'count': ('num_observations', 'int8'),
+    'completeness': ('completeness', 'float8'),
+}
+
+# Columns identifying a row of every rollup table
+ROLLUP_KEY = {
+    'STATION_NUMBER': 'text',
+    'Parameter': 'text',
+    'period_start': 'timestamp',
+}
+
+def percentile_column(pct):
+    """
+    Getting the column name of a percentile, e.g. value_p5 or value_p2_5
+    """
+    return 'value_p' + ('%g' % pct).replace('.', '_')
+
+def _series_starts(df):
+    """
+    Private function that flags the first row of every station/parameter
+    series in a block sorted by station and parameter
+    """
+    station = df['STATION_NUMBER'].to_numpy()
+    param = df['Parameter'].to_numpy()
+    start = np.ones(len(station), dtype=bool)
+    start[1:] = (station[1:] != station[:-1]) | (param[1:] != param[:-1])
+    return start
+
+class RollupEngine:
+    """
+    Engine computing every configured rollup level from blocks of hourly
+    readings (STATION_NUMBER, Parameter, ts and Value columns). Each block
+    must hold complete station/parameter series, which is guaranteed when the
+    hourly table is scanned in key order (see run). Aggregates of each level
+    are gathered in memory, since they are much smaller than the hourly data,
+    and written once the scan is complete
+    """
+    def __init__(self, levels, statistics, percentiles=(), table_prefix='rollup_'):
+        for level, period in levels.items():
+            if period not in PERIOD_UNITS:
+                raise ValueError("Unknown period '" + str(period) + "' for rollup level " + level
+                                 + " - must be one of " + ", ".join(PERIOD_UNITS))
+        for stat in statistics:
+            if stat not in STATISTICS:
+                raise ValueError("Unknown rollup statistic '" + str(stat) + "' - must be one of "
+                                 + ", ".join(STATISTICS))
+        for pct in percentiles:
+            if not 0 <= pct <= 100:
+                raise ValueError("Rollup percentiles must be between 0 and 100")
+        self.levels = dict(levels)
+        self.statistics = list(statistics)
+        self.percentiles = list(percentiles)
+        self.table_prefix = table_prefix
+        self._results = {level: [] for level in self.levels}
+        self.rows_scanned = 0
+
+    @classmethod
+    def from_options(cls, opts, levels=None):
+        """
+        Building an engine from the rollup options (options/rollups.json),
+        optionally limited to some of the configured levels
+        """
+        configured = opts['levels']
+        if levels is not None:
+            missing = [level for level in levels if level not in configured]
+            if len(missing) > 0:
+                raise ValueError("Rollup levels not configured: " + ", ".join(missing))
+            configured = {level: configured[level] for level in levels}
+        return cls(
+            configured,
+            opts.get('statistics', list(STATISTICS)),
+            opts.get('percentiles', []),
+            opts.get('table_prefix', 'rollup_'),
+        )
+
+    def table_name(self, level):
+        """
+        Getting the name of a level's table
+        """
+        return self.table_prefix + level
+
+    def column_types(self):
+        """
+        Getting the Postgres type of every column of the rollup tables
+        """
+        types = dict(ROLLUP_KEY)
+        for stat in self.statistics:
+            col, pg_type = STATISTICS[stat]
+            types[col] = pg_type
+        for pct in self.percentiles:
+            types[percentile_column(pct)] = 'float8'
+        return types
+
+    def aggregate(self, df, period, series_start=None):
+        """
+        Aggregating a block of hourly readings, sorted by station, parameter
+        and time, to one period length. Since the block is sorted, every
+        station/parameter/period group is a contiguous run of rows, so the
+        statistics are computed for all groups at once with numpy reductions
+        over the runs (and a single sort for the percentiles). Returns a frame
+        with a row per station, parameter and period
+        """
+        unit = PERIOD_UNITS[period]
+        if series_start is None:
+            series_start = _series_starts(df)
+        # Start of each reading's period, and the first row of every group
+        starts = df['ts'].to_numpy(dtype='datetime64[ns]').astype('datetime64[' + unit + ']')
+        new_group = series_start.copy()
+        new_group[1:] |= starts[1:] != starts[:-1]
+        first = np.flatnonzero(new_group)
+        group = np.cumsum(new_group) - 1
+        ngroups = len(first)
+
+        values = df['Value'].to_numpy(dtype='float64', na_value=np.nan)
+        valid = ~np.isnan(values)
+        count = np.bincount(group, weights=valid, minlength=ngroups).astype('int64')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            stats = {
+                'min': np.minimum.reduceat(np.where(valid, values, np.inf), first),
+                'max': np.maximum.reduceat(np.where(valid, values, -np.inf), first),
+                'mean': np.bincount(group, weights=np.where(valid, values, 0), minlength=ngroups) / count,
+            }
+        stats['min'][count == 0] = np.nan
+        stats['max'][count == 0] = np.nan
+        stats['count'] = count
+
+        # Share of the hours in each period that have a reading
+        period_start = starts[first]
+        hours = ((period_start + 1).astype('datetime64[h]') - period_start.astype('datetime64[h]')).astype('int64')
+        stats['completeness'] = count / hours
+
+        out = pd.DataFrame({
+            'STATION_NUMBER': df['STATION_NUMBER'].to_numpy()[first],
+            'Parameter': df['Parameter'].to_numpy()[first],
+            'period_start': period_start.astype('datetime64[ns]'),
+        })
+        for stat in self.statistics:
+            out[STATISTICS[stat][0]] = stats[stat]
+
+        if len(self.percentiles) > 0:
+            # Sorting values within each group (missing values sort last), and
+            # interpolating linearly between the closest ranks
+            ordered = values[np.lexsort((values, group))]
+            for pct in self.percentiles:
+                pos = (count - 1) * (pct / 100)
+                lo = np.floor(pos).astype('int64')
+                hi = np.ceil(pos).astype('int64')
+                lo_val = ordered[np.clip(first + lo, 0, len(ordered) - 1)]
+                hi_val = ordered[np.clip(first + hi, 0, len(ordered) - 1)]
+                result = lo_val + (hi_val - lo_val) * (pos - lo)
+                result[count == 0] = np.nan
+                out[percentile_column(pct)] = result
+        return out
+
+    def add_block(self, df):
+        """
+        Aggregating a block of complete station/parameter series to every level
+        """
+        self.rows_scanned += df.shape[0]
+        series_start = _series_starts(df)
+        for level, period in self.levels.items():
+            self._results[level].append(self.aggregate(df, period, series_start))
+
+    def scan(self, conn, schema, scan_rows=500000):
+        """
+        Reading the hourly table once, in key order, through a server-side
+        cursor, aggregating blocks of about scan_rows readings as they arrive.
+        The last station/parameter of each block is held back until its
+        series is complete
+        """
+        cols = ['STATION_NUMBER', 'Parameter', 'ts', 'Value']
+        cursor = conn.cursor(name='rollup_scan')
+        try:
+            cursor.execute(
+                """
+                select "STATION_NUMBER", "Parameter", ts, "Value"
+                from {}.hourly
+                order by "STATION_NUMBER", "Parameter", ts
+                """.format(schema)
+            )
+            carry = None
+            while True:
+                rows = cursor.fetchmany(scan_rows)
+                if len(rows) == 0:
+                    break
+                df = pd.DataFrame(rows, columns=cols)
+                if carry is not None:
+                    df = pd.concat([carry, df], ignore_index=True)
+                # Holding back the last series, which may continue in the next block
+                last = (df['STATION_NUMBER'].to_numpy() == df['STATION_NUMBER'].iloc[-1]) & \
+                    (df['Parameter'].to_numpy() == df['Parameter'].iloc[-1])
+                carry = df[last]
+                if not last.all():
+                    self.add_block(df[~last])
+            if carry is not None:
+                self.add_block(carry)
+        finally:
+            cursor.close()
+        conn.commit()
+
+    def write(self, conn, schema):
+        """
+        Writing each level to its own table. Every table is built under a
+        temporary name and swapped in within a single transaction, so readers
+        always see a complete table. Returns the number of rows of each level
+        """
+        types = self.column_types()
+        counts = {}
+        cursor = conn.cursor()
+        try:
+            for level in self.levels:
+                table = self.table_name(level)
+                build = table + '_build'
+                cursor.execute('drop table if exists {}.{}'.format(schema, build))
+                cursor.execute(
+                    'create table {}.{} ({})'.format(schema, build, ', '.join(
+                        '"{}" {}'.format(col, pg_type) for col, pg_type in types.items()
+                    ))
+                )
+                counts[level] = copy_frames(
+                    cursor, iter(self._results[level]), schema + '.' + build, types
+                )
+                cursor.execute(
+                    """
+                    create unique index {build}_key
+                    on {schema}.{build} ("STATION_NUMBER", "Parameter", period_start)
+                    """.format(schema=schema, build=build)
+                )
+                cursor.execute('drop table if exists {}.{}'.format(schema, table))
+                cursor.execute('alter table {}.{} rename to {}'.format(schema, build, table))
+                cursor.execute('alter index {}.{}_key rename to {}_key'.format(schema, build, table))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        return counts
+
+    def run(self, conn, schema, scan_rows=500000):
+        """
+        Computing and writing every rollup level. Returns the number of rows
+        of each level
+        """
+        self._results = {level: [] for level in self.levels}
+        self.rows_scanned = 0
+        self.scan(conn, schema, scan_rows)
+        return self.write(conn, schema)
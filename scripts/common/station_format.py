@@ -0,0 +1,193 @@
+# Date: 17/10/2026
+
+# Description: Parsing and formatting of the data tables on Pacfish station
+# pages to GW format, and link status checks, shared by the update and reset
+# helper functions
+
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from scripts.common.grid_parser import read_centered_grid
+
+# Tag appended to estimated values in station data tables
+ESTIMATED_TAG = '**Estimated'
+
+# Formats of the Time column in station data tables, tried in order
+TIME_FORMATS = [
+    '%m/%d/%Y %I:%M:%S %p',
+    '%m/%d/%Y %I:%M %p',
+    '%m/%d/%Y %H:%M:%S',
+    '%m/%d/%Y %H:%M',
+    '%Y-%m-%d %H:%M:%S',
+]
+
+# Time format detected from the first table parsed, reused for later tables
+_time_format = None
+
+# Parameters that can appear on each data type's page
+GROUP_PARAMETERS = {
+    'Hydrometric': ['Water Level', 'Sensor Depth'],
+    'Pressure': ['Pressure'],
+    'Temperature': ['Air Temperature', 'Water Temperature'],
+}
+
+def formatColNames(dat, url_grp):
+    """
+    Private function that formats column names for each dataframe by data type
+    """
+    if url_grp == "Hydrometric":
+        col_names = (
+            ['Time', 'Water Level', 'Sensor Depth'] 
+            if dat.shape[1] == 3 
+            else ['Time', 'Water Level']
+        )
+    elif(url_grp == 'Pressure'):
+        col_names = ['Time', 'Pressure']
+    else:
+        col_names = (
+            ['Time', 'Air Temperature', 'Water Temperature'] 
+            if dat.shape[1] == 3 
+            else ['Time', 'Water Temperature']
+        )
+    return col_names
+    
+def castDataColsToNumeric(dat, colnames):
+    """
+    Private function that formats numeric data columns to numeric by handling
+    "estimated" tags. Works for any number of data columns (every column after
+    Time): rows where any column is tagged as estimated get a Code of 21
+    """
+    # Data columns that contain text (columns without tags are already numeric)
+    str_cols = [col for col in colnames[1:] if pd.api.types.is_string_dtype(dat[col])]
+    if len(str_cols) == 0:
+        print('No cleaning of estimated data required')
+        dat['Code'] = ''
+        return dat
+
+    print('Cleaning estimated tags from', ', '.join(str_cols))
+    estimated = np.zeros(dat.shape[0], dtype=bool)
+    for col in str_cols:
+        # Parsing the column in a single pass - only tagged values fail to
+        # parse, so the tag is only removed (wherever it appears) from those rows
+        values = pd.to_numeric(dat[col], errors='coerce').astype('float64')
+        failed = (values.isna() & dat[col].notna()).to_numpy()
+        values[failed] = pd.to_numeric(
+            dat[col][failed].str.replace(ESTIMATED_TAG, '', regex=False)
+        )
+        estimated |= failed
+        dat[col] = values
+    # Assigning an estimated code (21) in a 'Code' column
+    dat['Code'] = np.where(estimated, '21', '')
+    # Returning the cleaned table with a new Code column
+    return dat
+    
+def parseTimestamps(times):
+    """
+    Private function that parses the Time column of a station table. The
+    format is detected from the first value and cached for later tables, so
+    that every column is parsed with an explicit format. Falls back to
+    pandas' format inference if no known format matches
+    """
+    global _time_format
+    if _time_format is None:
+        sample = times.dropna()
+        for fmt in TIME_FORMATS:
+            try:
+                datetime.strptime(sample.iloc[0], fmt)
+            except (IndexError, TypeError, ValueError):
+                continue
+            _time_format = fmt
+            break
+    if _time_format is not None:
+        try:
+            return pd.to_datetime(times, format=_time_format)
+        except ValueError:
+            pass
+    return pd.to_datetime(times)
+
+def format_station_data(df, url_grp, url_name, registry, since=None):
+    """
+    Formatting downloaded station data to GW format. The table is reshaped
+    from one column per parameter to one row per reading and parameter. If
+    since is given, only readings after that time are kept
+    """
+    # Renaming columns
+    df.columns = formatColNames(df, url_grp)
+    # Every column after Time holds the readings of a single parameter
+    params = list(df.columns[1:])
+
+    # Splitting the Time Column into dates and times, parsing it only once
+    ts = parseTimestamps(df['Time'])
+    # Dropping readings that are already stored before any further work
+    if since is not None:
+        keep = (ts > since).to_numpy()
+        df = df[keep].reset_index(drop=True)
+        ts = ts[keep].reset_index(drop=True)
+
+    # Formatting data types to numeric - inplace
+    castDataColsToNumeric(df, df.columns)
+
+    dates = ts.dt.normalize().to_numpy()
+    # Formatting times of day once per distinct value rather than per row
+    times_of_day, inverse = np.unique(ts.to_numpy() - dates, return_inverse=True)
+    time_labels = (pd.Timestamp(0) + pd.to_timedelta(times_of_day)).strftime('%H:%M:%S')
+    times = np.asarray(time_labels, dtype=object)[inverse.ravel()]
+
+    # Finally, getting the station name and station ID from the station registry
+    station = registry.by_url_name(url_name)
+
+    # Stacking the parameter columns one after another (wide to long)
+    nrows = df.shape[0]
+    nparams = len(params)
+    return pd.DataFrame({
+        'STATION_NUMBER': station['station_id'],
+        'STATION_NAME': station['station_name'],
+        'Date': np.tile(dates, nparams),
+        'Time': np.tile(times, nparams),
+        'Value': df[params].to_numpy(dtype='float64').ravel(order='F'),
+        'Parameter': np.repeat(params, nrows),
+        'Code': np.tile(df['Code'].to_numpy(), nparams),
+        'Comments': '',
+    })
+
+def parse_station_page(content, url_grp, url_name, registry, dtype_dict, since=None):
+    """
+    Parsing the data table from a station page's html and formatting it to GW
+    format, optionally keeping only readings after since
+    """
+    # Extracting the data table straight to a pandas dataframe
+    df = read_centered_grid(content)
+    # Formatting the dataframe to GW specifications
+    df = format_station_data(df, url_grp, url_name, registry, since)
+    # Ensuring types are consistently set
+    return df.astype(dtype_dict)
+
+def getLinkStatus(resp):
+    """
+    Private function that gets the success status of a single link from its
+    cached response, a bare status code, or the error raised while requesting it
+    """
+    if isinstance(resp, Exception):
+        return "Error: " + str(resp)
+    code = resp if isinstance(resp, int) else getattr(resp, 'status_code', None)
+    # A 304 (not modified) response to a conditional request is also valid
+    return "success" if code in (200, 304) else "Error: link invalid"
+
+def check_success_status(url_dict, check_all_valid = True):
+    """
+    Checking URL success status and returning a dictionary that contains 
+    success status by station. Takes a dictionary of responses (or status
+    codes) by station, so that already downloaded pages can be reused
+    """
+    success_dict = {
+        name: getLinkStatus(resp)
+        for name, resp in url_dict.items()
+    }
+    
+    if check_all_valid:
+        allValid = all(
+            [valid_check == "success" for valid_check in success_dict.values()]
+        )
+        return success_dict, allValid
+    else:
+        return success_dict
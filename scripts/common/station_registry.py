@@ -0,0 +1,116 @@
+# Date: 17/10/2026
+
+# Description: An index of the Pacfish station metadata table, built once per
+# run and shared by the update and reset scripts. Replaces repeatedly
+# filtering the reference table to look up a station or build its urls
+
+import pandas as pd
+
+# Root of the station pages on the Pacfish website
+BASE_URL = "http://www.pacfish.ca/wcviweather/Content%20Pages/"
+
+# Metadata column for each data type, and the name of its page on the website
+VARIABLE_PAGES = {
+    'staff_gauge': 'WaterLevel',
+    'water_temperature': 'Temperature',
+    'barometric_pressure': 'Pressure',
+}
+
+# Data types by the group names used throughout the scripts
+URL_GROUPS = {
+    'Hydrometric': 'staff_gauge',
+    'Pressure': 'barometric_pressure',
+    'Temperature': 'water_temperature',
+}
+
+def station_url(url_name, var):
+    """
+    Building the url of a station's page for a data type
+    """
+    return BASE_URL + url_name + "/" + VARIABLE_PAGES[var] + ".aspx"
+
+def _has_data(flag):
+    """
+    Private function that reads a data-availability flag from the metadata,
+    which may be a boolean, 0/1, a 'True'/'False' string or missing
+    """
+    if isinstance(flag, str):
+        return flag.strip().lower() == 'true'
+    return not pd.isna(flag) and bool(flag)
+
+class StationRegistry:
+    """
+    Station metadata indexed by url name and by station id, with the page urls
+    of every data type computed up front. Lookups return a dictionary of the
+    station's metadata row
+    """
+    def __init__(self, ref_tab):
+        self.ref_tab = ref_tab.reset_index(drop=True)
+        records = self.ref_tab.to_dict('records')
+        self._by_url_name = {rec['station_url_name']: rec for rec in records}
+        self._by_id = {rec['station_id']: rec for rec in records}
+        # Urls of every station with data for each data type, in table order
+        self._urls = {
+            var: {
+                rec['station_url_name']: station_url(rec['station_url_name'], var)
+                for rec in records if _has_data(rec[var])
+            }
+            for var in VARIABLE_PAGES
+        }
+
+    @classmethod
+    def from_csv(cls, path):
+        """
+        Building the registry from the station data csv
+        """
+        return cls(pd.read_csv(path))
+
+    @classmethod
+    def from_db(cls, db, schema):
+        """
+        Building the registry from the station_metadata table in the database
+        """
+        return cls(pd.read_sql_table('station_metadata', db, schema=schema))
+
+    def __contains__(self, station_id):
+        return station_id in self._by_id
+
+    def by_url_name(self, url_name):
+        """
+        Getting a station's metadata by its url name
+        """
+        try:
+            return self._by_url_name[url_name]
+        except KeyError:
+            raise KeyError("Station " + str(url_name) + " not found in station metadata") from None
+
+    def by_id(self, station_id):
+        """
+        Getting a station's metadata by its station id
+        """
+        try:
+            return self._by_id[station_id]
+        except KeyError:
+            raise KeyError("Station " + str(station_id) + " not found in station metadata") from None
+
+    def urls_by_variable(self, var):
+        """
+        Getting urls for all stations that have data from the selected variable
+        type, keyed by station url name
+        """
+        errMessage = "var must be one of 'staff_gauge', 'water_temperature', or 'barometric_pressure'"
+        assert (var in VARIABLE_PAGES), errMessage
+        return dict(self._urls[var])
+
+    def links(self, station_ids=None):
+        """
+        Getting the urls of every data type by url group, optionally limited
+        to a set of station ids
+        """
+        if station_ids is None:
+            return {url_grp: self.urls_by_variable(var) for url_grp, var in URL_GROUPS.items()}
+        url_names = [self.by_id(station_id)['station_url_name'] for station_id in station_ids]
+        return {
+            url_grp: {name: self._urls[var][name] for name in url_names if name in self._urls[var]}
+            for url_grp, var in URL_GROUPS.items()
+        }
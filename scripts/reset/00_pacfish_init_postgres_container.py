@@ -6,7 +6,9 @@
 #%% Loading libraries
 import os
 from pathlib import Path
+import sys
 os.chdir(Path(__file__).parent.parent.parent)
+sys.path.append(os.getcwd())
 import psycopg2
 from json import load
 
@@ -30,12 +32,10 @@ def reset_pacfish_dbase(creds):
     cursor = conn.cursor()
 
     print('Resetting schema...')
-    # Checking if the pacfish schema exists - creating if not, dropping and remaking if yes
-    cursor.execute('DROP TABLE IF EXISTS '+creds['schema']+'.hourly;')
-    cursor.execute('DROP TABLE IF EXISTS '+ creds['schema']+'.daily;')
-    cursor.execute('DROP TABLE IF EXISTS '+ creds['schema']+'.hourly_recent;')
-    cursor.execute('DROP TABLE IF EXISTS '+ creds['schema']+'.station_metadata;')
-    cursor.execute('DROP SCHEMA IF EXISTS '+ creds['schema']+';')
+    # Checking if the pacfish schema exists - creating if not, dropping and remaking if yes.
+    # The schema is dropped with everything in it (the hourly partitions and
+    # views, the rollup tables, a kept hourly_legacy table etc.)
+    cursor.execute('DROP SCHEMA IF EXISTS '+ creds['schema']+' CASCADE;')
     cursor.execute('CREATE SCHEMA '+ creds['schema']+';')
     cursor.execute('GRANT ALL ON SCHEMA '+ creds['schema']+' TO postgres, ' + creds['user'] + ';')
     cursor.execute('commit')
@@ -5,16 +5,20 @@
 
 # %% ==== Loading libraries ====
 import os
+import sys
 from pathlib import Path
 os.chdir(Path(__file__).parent.parent.parent)
+sys.path.append(os.getcwd())
 import pandas as pd
-from datetime import datetime
-from selenium import webdriver
 from bs4 import BeautifulSoup
 from json import load
 from sqlalchemy import create_engine
 import re
-import subprocess
+from scripts.common.http_session import HttpClient
+from scripts.common.postback import build_date_range_form, read_picker_dates
+from scripts.common.page_archive import PageArchive
+from scripts.common.station_registry import StationRegistry
+from scripts.reset.reset_help_funcs import reset_stations, summarise_reset_results, reset_pool_size
 
 # %% ==== Initalizing global variables ====
 
@@ -28,8 +32,21 @@ fpaths = load(open('options/filepaths.json',))
 # the data folder under the current working directory
 path_to_ref_tab = fpaths['station_data']
 
-# Path to the geckodriver that runs firefox in automative mode
-gecko_path = fpaths['geckodriver']
+# Reading download settings (concurrency, timeouts and retries) from JSON
+fetch_opts = load(open('options/fetch.json',))
+
+# Number of stations whose archives are reset at the same time
+reset_workers = fetch_opts.get('reset_workers', 4)
+
+# Shared HTTP client (pooled connections, timeouts and retries) used for every
+# request made during this run, with the reset deadline rather than the update
+# one and enough pooled connections for every reset worker
+client = HttpClient.from_options(fetch_opts, deadline_key='reset_run_deadline',
+                                 pool_size=reset_pool_size(fetch_opts, reset_workers))
+
+# Archive of the raw html of every downloaded page, so that pages can be
+# re-parsed later without re-scraping
+page_archive = PageArchive(fpaths['page_archive'])
 
 # %% ==== Setting up database connection ====
 db = create_engine('postgresql+psycopg2://{}:{}@{}:{}/{}?options=-csearch_path%3D{}'.format(
@@ -39,23 +56,19 @@ db = create_engine('postgresql+psycopg2://{}:{}@{}:{}/{}?options=-csearch_path%3
     creds['port'],
     creds['dbname'],
     creds['schema'],
-))
+), pool_size=reset_workers)
 conn = db.raw_connection()
 cursor = conn.cursor()
 
-# %% ==== Initializing Selenium browser ====
-
-# Opening firefox driver
-browser = webdriver.Firefox(executable_path=gecko_path)
+# %% ==== Getting basic station info ====
 
-# Navigating to the main pacfish page
+# Downloading the main pacfish page
 baseurl = 'http://www.pacfish.ca/wcviweather/'
-browser.get(baseurl)
-
-# %% ==== Getting basic station info ====
+main_page = client.get(baseurl)
+main_page.raise_for_status()
 
 # Reading page source
-soup = BeautifulSoup(browser.page_source, 'html.parser')
+soup = BeautifulSoup(main_page.content, 'html.parser')
 
 # Getting list of stations sidebar element
 stat_list = soup.find(attrs={'id': 'sidebar'}) \
@@ -133,32 +146,18 @@ end_list = list()
 for i in range(0, dat.shape[0]):
     # Getting data url
     url = dat.iloc[i]['Staff Gauge']
-    # Navigating to url
-    browser.get(url)
-    # Getting the 'from' date element
-    elem = browser.find_element_by_id('ContentPlaceHolder1_DateTimePicker')
-    # Setting the value tag to an arbitrary very old start date
-    browser.execute_script('arguments[0].setAttribute("value", "Jan 01, 1950 00:00")', elem)
-    # Clicking to get data - it fails because the index is out of range, but the website populates the range with the correct min and max data ranges
-    browser.find_element_by_id('ContentPlaceHolder1_Button1').click()
-
-    # Getting the start date
-    elem = browser.find_element_by_id('ContentPlaceHolder1_DateTimePicker')
-    start_date = elem.get_attribute('value')
-    try:
-        start_date = datetime.strptime(start_date, '%b %d, %Y %I:%M %p').strftime('%Y/%m/%d %H:%M')
-    except:
-        start_date = datetime.strptime(start_date, '%b %d, %Y %H:%M').strftime('%Y/%m/%d %H:%M')
-    start_list.append(start_date)
-
-    # End date
-    elem = browser.find_element_by_id('ContentPlaceHolder1_DateTimePicker2')
-    end_date = elem.get_attribute('value')
-    try:
-        end_date = datetime.strptime(end_date, '%b %d, %Y %I:%M %p').strftime('%Y/%m/%d %H:%M')
-    except ValueError:
-        end_date = datetime.strptime(end_date, '%b %d, %Y %H:%M').strftime('%Y/%m/%d %H:%M')
-    end_list.append(end_date)
+    # Downloading the page's date-picker form
+    page = client.get(url)
+    page.raise_for_status()
+    # Submitting the form with an arbitrary very old start date - it fails because the index is out of range, but the website populates the range with the correct min and max data ranges
+    form = build_date_range_form(page.content, 'Jan 01, 1950 00:00')
+    page = client.post(url, data=form)
+    page.raise_for_status()
+
+    # Getting the start and end dates from the returned date-pickers
+    start_date, end_date = read_picker_dates(page.content)
+    start_list.append(start_date.strftime('%Y/%m/%d %H:%M'))
+    end_list.append(end_date.strftime('%Y/%m/%d %H:%M'))
 
 # Adding date columns to dataframe
 dat['start_date'] = start_list
@@ -225,6 +224,7 @@ dat = dat[['station_id', 'station_name', 'station_url_name', 'start_date', 'end_
 
 # %% ==== Checking for new stations since last update ====
 print("Updating metadata table in Postgres...")
+fullReset = False
 try:
     cursor.execute("select * from " + creds['schema'] + ".station_metadata")
     curr_stats = pd.DataFrame(cursor.fetchall(), columns=dat.columns)
@@ -246,18 +246,25 @@ except:
 # %% ==== Calling an archive reset for all new stations ====
 print("Getting the full archive for any new stations...")
 if len(new_stats) > 0:
-    for statid in new_stats:
-        print('Getting timeseries for station: ' + statid)
-        if (statid == list(new_stats)[0]) and fullReset:
-            print("Also resetting/re-creating the hourly table.")
-            subprocess.run(args = ('python scripts/reset/02_pacfish_reset_by_station.py -r -s "' + statid +'"'), shell=True)
-        else:
-            subprocess.run(args = ('python scripts/reset/02_pacfish_reset_by_station.py -s "' + statid +'"'), shell=True)
+    # Resetting all new stations in this process, re-creating the hourly table
+    # once up front in case of a full reset
+    results = reset_stations(
+        sorted(new_stats),
+        StationRegistry(dat),
+        client,
+        db,
+        creds['schema'],
+        page_archive,
+        fetch_opts,
+        workers=reset_workers,
+        recreate=fullReset
+    )
+    print(summarise_reset_results(results).to_string(index=False))
+    print('HTTP request summary:', client.latency_summary())
+    print('Rate limiter state:', client.rate_summary())
 else:
     print("No new stations since last update.")
 # %% Writing metadata file to disk
 dat.to_csv(path_to_ref_tab, index=False, na_rep='NA')
-# Closing browser
-browser.close()
 print("Pacfish station updates complete")
 # %%
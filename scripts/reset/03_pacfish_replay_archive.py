@@ -0,0 +1,192 @@
+# Date: 16/10/2026
+
+# Description: Re-parsing and re-loading station data from the raw page archive
+# without touching the network, e.g. after a change to the formatting functions
+
+# %% ==== Loading libraries ====
+import os
+import sys
+from pathlib import Path
+os.chdir(Path(__file__).parent.parent.parent)
+sys.path.append(os.getcwd())
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from optparse import OptionParser
+from sqlalchemy import create_engine
+from json import load
+from scripts.reset.init_help_funcs import parse_station_page
+from scripts.common.page_archive import PageArchive, read_blob
+from scripts.common.station_registry import StationRegistry
+from scripts.common.hourly_load import ensure_hourly_tables, create_staging_table, replace_spans
+from scripts.common.bulk_loader import copy_frames, BULK_STAGING
+
+# Defining a dictionary of column data types (this will be appied to the
+# re-parsed data)
+dtype_dict = {
+    'STATION_NUMBER': 'str',
+    'STATION_NAME': 'str',
+    'Date': 'datetime64[ns]',
+    'Time': 'str',
+    'Value': 'float64',
+    'Parameter': 'str',
+    'Code': 'str',
+    'Comments': 'str',
+}
+
+# Columns identifying a single reading
+key_cols = ['STATION_NUMBER', 'Parameter', 'Date', 'Time']
+
+def page_spans(df):
+    """
+    Getting the time span covered by a parsed page for each parameter, as
+    (parameter, first timestamp, last timestamp) tuples
+    """
+    ts = df['Date'] + pd.to_timedelta(df['Time'])
+    spans = ts.groupby(df['Parameter']).agg(['min', 'max'])
+    return [
+        (param, row['min'].to_pydatetime(), row['max'].to_pydatetime())
+        for param, row in spans.iterrows()
+    ]
+
+def parse_archived_pages(root, digests, url_grp, url_name, registry):
+    """
+    Parsing every archived page for one station and variable (run in a worker
+    process), returning a single frame in which later pages take precedence
+    over earlier ones, and the time spans covered by each page
+    """
+    frames = [
+        parse_station_page(read_blob(root, digest), url_grp, url_name, registry, dtype_dict)
+        for digest in digests
+    ]
+    spans = [span for df in frames if df.shape[0] > 0 for span in page_spans(df)]
+    df = pd.concat(frames, ignore_index=True)
+    # Pages are in fetch order, so keeping the last copy of each reading
+    return df.drop_duplicates(subset=key_cols, keep='last'), spans
+
+def replay_archive(archive, registry, db, schema, stations=None, since=None,
+                   until=None, workers=None):
+    """
+    Replaying archived pages into the hourly table. For each station and
+    variable the stored readings within the span of each replayed page are
+    replaced by the re-parsed data (see replace_spans), in a single
+    transaction. Readings outside every replayed page are left alone
+    """
+    # Grouping archived pages by station and variable, de-duplicating repeated
+    # identical pages while keeping fetch order
+    groups = {}
+    for entry in archive.entries(stations, since, until):
+        digests = groups.setdefault((entry['variable'], entry['station']), [])
+        if entry['digest'] not in digests:
+            digests.append(entry['digest'])
+    print("Replaying", len(groups), "station/variable archives")
+
+    conn = db.raw_connection()
+    ensure_hourly_tables(conn, schema)
+    cursor = conn.cursor()
+    status = {}
+    # Parsing in parallel across cores, loading in this process as each
+    # station finishes
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(parse_archived_pages, str(archive.root), digests,
+                            url_grp, url_name, registry): (url_grp, url_name)
+            for (url_grp, url_name), digests in groups.items()
+        }
+        for future in as_completed(futures):
+            url_grp, url_name = futures[future]
+            try:
+                df, spans = future.result()
+                if df.shape[0] == 0:
+                    raise ValueError("No readings in the archived pages")
+                # Rearranging columns to match specification
+                df = df[list(dtype_dict.keys())]
+                # Copying the re-parsed data into the staging table, and
+                # replacing the stored readings within each page's span
+                create_staging_table(cursor, BULK_STAGING)
+                copy_frames(cursor, [df])
+                counts = replace_spans(cursor, schema, df['STATION_NUMBER'].iloc[0],
+                                       spans, BULK_STAGING)
+                conn.commit()
+                status[(url_grp, url_name)] = "success"
+                print("Replayed", len(df), "rows for Station:", url_name, ", Data type:", url_grp,
+                      "-", counts['inserted'], "inserted,", counts['updated'], "updated,",
+                      counts['unchanged'], "unchanged,", counts['deleted'], "removed")
+            except Exception as e:
+                conn.rollback()
+                print(url_grp, "replay failed for station:", url_name)
+                print("Error:", str(e))
+                status[(url_grp, url_name)] = "Error: " + str(e)
+    cursor.close()
+    conn.close()
+    return status
+
+# %%
+if __name__ == "__main__":
+    # Initializing option parsing
+    parser = OptionParser()
+    parser.add_option(
+        "-s", "--station",
+        dest="stations",
+        action="append",
+        help="""
+        Pacfish station id to replay (can be given more than once). Defaults to all archived stations
+        """
+    )
+    parser.add_option(
+        "--since",
+        dest="since",
+        action="store",
+        help="Only replay pages fetched on or after this date (YYYY-MM-DD)"
+    )
+    parser.add_option(
+        "--until",
+        dest="until",
+        action="store",
+        help="Only replay pages fetched on or before this date (YYYY-MM-DD)"
+    )
+    parser.add_option(
+        "-w", "--workers",
+        dest="workers",
+        action="store",
+        type="int",
+        default=None,
+        help="Number of parsing processes. Defaults to the number of cores"
+    )
+    options, args = parser.parse_args()
+
+    # Reading credentials and filepaths from JSON
+    creds = load(open('options/credentials.json',))
+    fpaths = load(open('options/filepaths.json',))
+
+    # Setting the default schema to 'pacfish' unless another was specified in the file
+    if 'schema' not in creds.keys():
+        creds['schema'] = 'pacfish'
+
+    # Database connection
+    db = create_engine('postgresql+psycopg2://{}:{}@{}:{}/{}?options=-csearch_path%3D{}'.format(
+        creds['user'],
+        creds['password'],
+        creds['host'],
+        creds['port'],
+        creds['dbname'],
+        creds['schema']
+    ))
+
+    # Reading station metadata
+    registry = StationRegistry.from_csv(fpaths['station_data'])
+
+    # The archive is keyed by station url name, so converting any station ids
+    stations = None
+    if options.stations is not None:
+        stations = set(
+            registry.by_id(station_id)['station_url_name']
+            for station_id in options.stations if station_id in registry
+        )
+
+    status = replay_archive(
+        PageArchive(fpaths['page_archive']), registry, db, creds['schema'],
+        stations, options.since, options.until, options.workers
+    )
+    print("Archive replay complete:", sum(s == "success" for s in status.values()),
+          "of", len(status), "station/variable archives loaded")
+# %%
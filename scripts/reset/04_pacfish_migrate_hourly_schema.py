@@ -0,0 +1,126 @@
+# Date: 17/10/2026
+
+# Description: One-time migration of the hourly table from the original
+# layout (written by pandas to_sql, with text Date/Time/Code columns and no
+# indexes) to the typed, indexed and yearly-partitioned layout defined in
+# scripts/common/hourly_schema.py. The original table is kept as hourly_legacy
+# unless --drop-legacy is given
+
+# %% ==== Loading libraries ====
+import os
+import sys
+from pathlib import Path
+os.chdir(Path(__file__).parent.parent.parent)
+sys.path.append(os.getcwd())
+from datetime import datetime
+from optparse import OptionParser
+from json import load
+import psycopg2
+from scripts.common.hourly_schema import (
+    hourly_layout, create_hourly_table, FIRST_PARTITION_YEAR, TS_EXPR, CODE_EXPR
+)
+from scripts.common.hourly_load import ensure_hwm_table, HWM_TABLE
+
+# Name the original table is kept under
+LEGACY_TABLE = 'hourly_legacy'
+
+def migrate_hourly(conn, schema, drop_legacy=False):
+    """
+    Copying every reading of the original hourly table into a new partitioned
+    hourly table, in a single transaction. Repeated readings (same station,
+    parameter and timestamp) are only copied once, and readings without a
+    date or time are skipped. Returns the number of rows copied
+    """
+    cursor = conn.cursor()
+    try:
+        layout = hourly_layout(cursor, schema)
+        if layout != 'legacy':
+            print("The hourly table doesn't need migrating (layout:", layout + ")")
+            return 0
+
+        print("Renaming the original table to", LEGACY_TABLE + "...")
+        cursor.execute('alter table {}.hourly rename to {}'.format(schema, LEGACY_TABLE))
+        # Freeing the name of the unique reading key if it exists
+        cursor.execute('drop index if exists {}.hourly_reading_key'.format(schema))
+
+        # Creating the new table with a partition for every year on record
+        cursor.execute(
+            'select extract(year from min("Date"))::int from {}.{}'.format(schema, LEGACY_TABLE)
+        )
+        first_year = cursor.fetchone()[0] or FIRST_PARTITION_YEAR
+        print("Creating the partitioned hourly table...")
+        create_hourly_table(cursor, schema, min(first_year, FIRST_PARTITION_YEAR))
+
+        print("Copying readings...")
+        cursor.execute(
+            """
+            insert into {schema}.hourly
+                ("STATION_NUMBER", "STATION_NAME", ts, "Value", "Parameter", "Code", "Comments")
+            select "STATION_NUMBER", coalesce("STATION_NAME", ''), {ts}, "Value",
+                "Parameter", {code}, coalesce("Comments", '')
+            from {schema}.{legacy}
+            where "STATION_NUMBER" is not null and "Parameter" is not null
+            and "Date" is not null and "Time" is not null
+            on conflict ("STATION_NUMBER", "Parameter", ts) do nothing
+            """.format(schema=schema, legacy=LEGACY_TABLE, ts=TS_EXPR, code=CODE_EXPR)
+        )
+        nrows = cursor.rowcount
+        cursor.execute('select count(*) from {}.{}'.format(schema, LEGACY_TABLE))
+        print("Copied", nrows, "of", cursor.fetchone()[0], "rows")
+
+        # Rebuilding the high-water marks from the new table
+        cursor.execute('drop table if exists {}.{}'.format(schema, HWM_TABLE))
+        if drop_legacy:
+            print("Dropping", LEGACY_TABLE + "...")
+            cursor.execute('drop table {}.{}'.format(schema, LEGACY_TABLE))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    ensure_hwm_table(conn, schema)
+    # Refreshing planner statistics for the new table
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute('analyze {}.hourly'.format(schema))
+    cursor.close()
+    conn.autocommit = False
+    return nrows
+
+# %%
+if __name__ == "__main__":
+    # Initializing option parsing
+    parser = OptionParser()
+    parser.add_option(
+        "--drop-legacy",
+        dest="drop_legacy",
+        action="store_true",
+        default=False,
+        help="""
+        Drop the original table once its readings are copied, instead of keeping it as hourly_legacy
+        """
+    )
+    options, args = parser.parse_args()
+
+    # Reading credentials from JSON
+    creds = load(open('options/credentials.json',))
+
+    # Setting the default schema to 'pacfish' unless another was specified in the file
+    if 'schema' not in creds.keys():
+        creds['schema'] = 'pacfish'
+
+    # Database connection
+    conn = psycopg2.connect(
+        host=creds['host'],
+        port=creds['port'],
+        dbname=creds['dbname'],
+        user=creds['user'],
+        password=creds['password']
+    )
+    start = datetime.now()
+    nrows = migrate_hourly(conn, creds['schema'], options.drop_legacy)
+    conn.close()
+    print("Migration complete:", nrows, "rows in", str(datetime.now() - start))
+# %%
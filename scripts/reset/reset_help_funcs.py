@@ -0,0 +1,348 @@
+# Date: 16/10/2026
+
+# Description: Functions for resetting the full historical archive of one or
+# many stations from within a single process
+
+import pandas as pd
+from datetime import datetime
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from scripts.reset.init_help_funcs import parse_station_stream, check_success_status
+from scripts.common.postback import stream_date_range, read_first_reading_date, NoDataTable
+from scripts.common.async_fetch import fetch_link_groups
+from scripts.common.hourly_load import ensure_hourly_tables, replace_station_data, create_staging_table, HWM_TABLE, REVISIONS_TABLE
+from scripts.common.hourly_schema import create_hourly_table, drop_recent_view
+from scripts.common.daily_agg import DAILY_TABLE, PENDING_TABLE
+from scripts.common.bulk_loader import copy_frames, BULK_STAGING
+
+# Dictionary of column data types (this will be appied to newly downloaded
+# data)
+dtype_dict = {
+    'STATION_NUMBER': 'str',
+    'STATION_NAME': 'str',
+    'Date': 'datetime64[ns]',
+    'Time': 'str',
+    'Value': 'float64',
+    'Parameter': 'str',
+    'Code': 'str',
+    'Comments': 'str',
+}
+
+# Arbitrary old date from which archives are requested - the website resets it
+# to the first reading of each page
+ARCHIVE_START = datetime(2000, 1, 1)
+
+def recreate_hourly_table(db, schema):
+    """
+    Clearing and remaking the (empty) hourly table, with its indexes and
+    partitions, and empty high-water-mark, revision log and daily tables
+    """
+    conn = db.raw_connection()
+    try:
+        cursor = conn.cursor()
+        drop_recent_view(cursor, schema)
+        cursor.execute('drop table if exists {}.hourly'.format(schema))
+        cursor.execute('drop table if exists {}.{}'.format(schema, HWM_TABLE))
+        cursor.execute('drop table if exists {}.{}'.format(schema, REVISIONS_TABLE))
+        cursor.execute('drop table if exists {}.{}'.format(schema, DAILY_TABLE))
+        cursor.execute('drop table if exists {}.{}'.format(schema, PENDING_TABLE))
+        create_hourly_table(cursor, schema)
+        cursor.close()
+        conn.commit()
+        ensure_hourly_tables(conn, schema)
+    finally:
+        conn.close()
+
+def reset_pool_size(fetch_opts, workers):
+    """
+    Getting the number of HTTP connections to pool for a reset run on workers
+    threads, each of which can have as many requests open at once as its
+    link checks (max_per_host) or its date windows (archive_window_workers)
+    """
+    per_station = fetch_opts.get('max_per_host', 4)
+    if fetch_opts.get('archive_window_months', 0) > 0:
+        per_station = max(per_station, fetch_opts.get('archive_window_workers', 4))
+    return max(fetch_opts.get('max_concurrency', 10), workers * per_station)
+
+def archive_windows(start, end, months):
+    """
+    Splitting the span from start to end into consecutive date windows, with
+    boundaries on the first of every `months`-th month (e.g. 12 for calendar
+    years, 3 for quarters)
+    """
+    windows = []
+    win_start = start
+    while win_start < end:
+        # Months since January of the window's year at which the window ends
+        offset = (win_start.month - 1) // months * months + months
+        win_end = min(datetime(win_start.year + offset // 12, offset % 12 + 1, 1), end)
+        windows.append((win_start, win_end))
+        win_start = win_end
+    return windows
+
+def archive_start_date(client, url, page, url_name):
+    """
+    Getting the date from which a station page's archive should be requested:
+    the first reading of that page's data type as reported by the website, so
+    that every data type is requested from its own first reading. Falls back
+    to an arbitrary old start date if the website doesn't report one
+    """
+    # Leiner has a weird glitch preventing the auto-setting feature of pacfish from working
+    if url_name == 'Leiner':
+        return datetime(2018, 10, 9, 11, 1)
+    try:
+        return read_first_reading_date(client, url, page, ARCHIVE_START)
+    except (KeyError, ValueError) as e:
+        print("Couldn't read the first reading date of station:", url_name, "-", str(e))
+        return ARCHIVE_START
+
+def iter_window_batches(client, url, page, win_start, win_end, url_grp,
+                        url_name, registry, page_archive, batch_size=10000):
+    """
+    Streaming a single date window of a station's archive, yielding formatted
+    batches of the readings that fall inside the window as the page arrives.
+    The raw page is archived as it streams through
+    """
+    # The end date is left to the website for the final window (None)
+    chunks = stream_date_range(client, url, win_start, win_end, page=page)
+    chunks = page_archive.store_stream(chunks, url_name, url_grp, source='reset')
+    for df in parse_station_stream(chunks, url_grp, url_name, registry, dtype_dict, batch_size):
+        # Dropping readings on the window boundaries that belong to a neighbouring window
+        ts = df['Date'] + pd.to_timedelta(df['Time'])
+        in_window = ts >= win_start
+        if win_end is not None:
+            in_window &= ts < win_end
+        if in_window.any():
+            yield df[in_window]
+
+def fetch_window(client, url, page, win_start, win_end, url_grp, url_name,
+                 registry, page_archive, retries, batch_size=10000):
+    """
+    Downloading and parsing a single date window of a station's archive,
+    retrying the download on its own if it fails. Returns a list of batches
+    of the readings that fall inside the window (empty if there are none)
+    """
+    for attempt in range(retries + 1):
+        try:
+            return list(iter_window_batches(
+                client, url, page, win_start, win_end, url_grp, url_name,
+                registry, page_archive, batch_size
+            ))
+        except NoDataTable:
+            return []
+        except Exception as e:
+            if attempt == retries:
+                raise
+            print("Retrying", url_grp, "window from", win_start, "for station:", url_name, "-", str(e))
+
+def iter_single_window(client, url, page, win_start, win_end, url_grp,
+                       url_name, registry, page_archive, batch_size=10000):
+    """
+    Streaming batches of a date window like iter_window_batches, but ending
+    quietly if the window has no data table (so that no error is raised
+    while the batches are being copied to the database)
+    """
+    try:
+        yield from iter_window_batches(
+            client, url, page, win_start, win_end, url_grp, url_name,
+            registry, page_archive, batch_size
+        )
+    except NoDataTable:
+        return
+
+def iter_window_results(executor, fetch, windows, workers):
+    """
+    Yielding the batches of each date window in order, fetching them on an
+    executor with fetch (called with a window's start and end and returning
+    its batches). Windows are submitted lazily, so at most `workers` windows
+    are being downloaded or held in memory at a time, and every window is
+    released once its batches have been consumed
+    """
+    windows = iter(windows)
+    pending = deque(executor.submit(fetch, *window) for window in islice(windows, workers))
+    try:
+        while len(pending) > 0:
+            yield from pending.popleft().result()
+            # Replacing the consumed window with the next one
+            for window in islice(windows, 1):
+                pending.append(executor.submit(fetch, *window))
+    finally:
+        # Dropping windows that haven't started if loading stopped early
+        for future in pending:
+            future.cancel()
+
+def load_archive(cursor, frames, station_id, schema):
+    """
+    Replacing a station's data in the hourly table with an iterable of
+    formatted batches (e.g. a generator streaming them from the website).
+    The batches are streamed into a staging table with a single COPY, so only
+    one batch is held in memory at a time, and the station's stored data for
+    each parameter in the staging table is then replaced from it (see
+    replace_station_data). Returns the number of rows copied. The caller
+    commits
+    """
+    create_staging_table(cursor, BULK_STAGING)
+    nrows = copy_frames(cursor, frames)
+    if nrows == 0:
+        return 0
+    counts = replace_station_data(cursor, schema, station_id, BULK_STAGING)
+    print("Station", station_id, "-", counts['inserted'], "rows inserted,", counts['updated'],
+          "updated,", counts['unchanged'], "unchanged,", counts['deleted'], "removed")
+    return nrows
+
+def reset_station(station_id, registry, client, db, schema, page_archive, fetch_opts):
+    """
+    Re-downloading the full archive of a single station and replacing its data
+    in the hourly table. Returns the success status of each data type
+    """
+    # Getting the metadata of the station of interest
+    try:
+        station = registry.by_id(station_id)
+    except KeyError as e:
+        raise ValueError(str(e)) from None
+
+    # Getting the url name of the station of interest
+    url_name = station['station_url_name']
+
+    # Links for every data type recorded at this station
+    links = registry.links([station_id])
+
+    # Checking that the urls are valid, keeping the page bodies since they
+    # hold the form state needed to request the full archive
+    responses = fetch_link_groups(
+        links,
+        client,
+        max_concurrency=fetch_opts['max_concurrency'],
+        max_per_host=fetch_opts['max_per_host']
+    )
+    success_status = {
+        url_grp: check_success_status(responses[url_grp], check_all_valid=False)
+        for url_grp in links
+    }
+
+    # Taking a connection from the engine's pool for this station
+    conn = db.raw_connection()
+    cursor = conn.cursor()
+    try:
+        for url_grp in links:
+            # Skipping data types this station doesn't have, or whose link is invalid
+            if success_status[url_grp].get(url_name) != 'success':
+                continue
+            try:
+                url = links[url_grp][url_name]
+                # Form state from the page downloaded during the validity check
+                page = responses[url_grp][url_name].content
+                # Splitting the archive into date windows from this data
+                # type's own first reading (a window length of 0 requests the
+                # whole archive at once). The last window is left open-ended
+                # so that it includes the latest readings
+                start_date = archive_start_date(client, url, page, url_name)
+                window_months = fetch_opts.get('archive_window_months', 0)
+                windows = []
+                if window_months > 0:
+                    windows = archive_windows(start_date, datetime.now(), window_months)
+                if len(windows) == 0:
+                    windows = [(start_date, None)]
+                windows[-1] = (windows[-1][0], None)
+
+                batch_size = fetch_opts.get('stream_batch_rows', 10000)
+                if len(windows) == 1:
+                    # A single window is streamed straight into the database
+                    # as it downloads
+                    batches = iter_single_window(
+                        client, url, page, windows[0][0], windows[0][1],
+                        url_grp, url_name, registry, page_archive, batch_size
+                    )
+                    nrows = load_archive(cursor, batches, station_id, schema)
+                else:
+                    # Requesting windows concurrently, reusing the form state
+                    # from the page downloaded during the validity check
+                    workers = fetch_opts.get('archive_window_workers', 4)
+                    with ThreadPoolExecutor(max_workers=workers) as executor:
+                        # Streaming windows to the database in date order as
+                        # they become available
+                        batches = iter_window_results(
+                            executor,
+                            lambda win_start, win_end: fetch_window(
+                                client, url, page, win_start, win_end, url_grp,
+                                url_name, registry, page_archive,
+                                fetch_opts.get('archive_window_retries', 2), batch_size
+                            ),
+                            windows, workers
+                        )
+                        try:
+                            nrows = load_archive(cursor, batches, station_id, schema)
+                        finally:
+                            # Cancelling the remaining windows if loading failed
+                            batches.close()
+
+                if nrows == 0:
+                    raise NoDataTable("No data returned for any date window")
+                # Committing the delete and every window together, so a failed
+                # window never leaves a partial archive
+                conn.commit()
+                # Status update
+                print("Successfully completed data pull for Station: ",
+                      url_name, ", Data type:", url_grp, "(" + str(len(windows)), "windows,", nrows, "rows)")
+            except Exception as e:
+                conn.rollback()
+                # Printing a message in case of an error
+                print(url_grp, "data scrape failed for station:", url_name)
+                print("Error:", str(e))
+                # Saving the error message in the success dictionary
+                success_status[url_grp][url_name] = "Error: " + str(e)
+    finally:
+        # Returning the connection to the pool
+        cursor.close()
+        conn.close()
+    return success_status
+
+def reset_stations(station_ids, registry, client, db, schema, page_archive,
+                   fetch_opts, workers=4, recreate=False):
+    """
+    Resetting the archives of many stations on a pool of worker threads that
+    share the HTTP client and the database connection pool. If recreate is
+    True the hourly table is remade once before any station is loaded.
+    Returns the success status of each station by data type
+    """
+    if recreate:
+        print("Resetting/re-creating the hourly table.")
+        recreate_hourly_table(db, schema)
+    else:
+        # Making sure the hourly table has its unique reading key (and the
+        # high-water-mark table exists) before loading
+        conn = db.raw_connection()
+        try:
+            ensure_hourly_tables(conn, schema)
+        finally:
+            conn.close()
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(reset_station, station_id, registry, client, db,
+                            schema, page_archive, fetch_opts): station_id
+            for station_id in station_ids
+        }
+        for future in as_completed(futures):
+            station_id = futures[future]
+            try:
+                results[station_id] = future.result()
+            except Exception as e:
+                print("Archive reset failed for station:", station_id)
+                print("Error:", str(e))
+                results[station_id] = {'All': "Error: " + str(e)}
+    return results
+
+def summarise_reset_results(results):
+    """
+    Formatting reset results as a dataframe of status by station and data type
+    """
+    rows = [
+        {'station_id': station_id, 'data_type': url_grp, 'status': status}
+        for station_id, station_status in results.items()
+        for url_grp, grp_status in station_status.items()
+        for status in (grp_status.values() if isinstance(grp_status, dict) else [grp_status])
+    ]
+    return pd.DataFrame(rows, columns=['station_id', 'data_type', 'status'])
@@ -9,14 +9,19 @@ import sys
 from pathlib import Path
 os.chdir(Path(__file__).parent.parent.parent)
 sys.path.append(os.getcwd())
-import requests
 import pandas as pd
 from datetime import datetime, timedelta
-from bs4 import BeautifulSoup
-from io import StringIO
+from functools import partial
 from json import load
 from sqlalchemy import create_engine
-from scripts.update.update_help_funcs import format_station_data, get_urls_by_variable, check_success_status
+from scripts.update.update_help_funcs import parse_station_page, check_success_status, revision_cutoff
+from scripts.common.http_session import HttpClient
+from scripts.common.page_cache import PageCache
+from scripts.common.page_archive import PageArchive
+from scripts.common.station_registry import StationRegistry
+from scripts.common.hourly_load import ensure_hourly_tables, read_hwm
+from scripts.common.bulk_loader import BulkLoader
+from scripts.common.async_fetch import fetch_as_completed, flatten_links
 
 # %% ==== Initializing user facing global variables ====
 
@@ -26,6 +31,13 @@ creds = load(open('options/credentials.json',))
 # Reading filepaths from JSON
 fpaths = load(open('options/filepaths.json',))
 
+# Reading download settings (concurrency, timeouts and retries) from JSON
+fetch_opts = load(open('options/fetch.json',))
+
+# Shared HTTP client (pooled connections, timeouts and retries) used for every
+# request made during this run
+client = HttpClient.from_options(fetch_opts)
+
 # Setting the default schema to 'pacfish' unless another was specified in the file
 if 'schema' not in creds.keys():
     creds['schema'] = 'pacfish'
@@ -49,11 +61,20 @@ path_to_ref_tab =  fpaths['station_data']
 # Path to status report
 path_to_report = fpaths['report']
 
-# %% ==== Initializing script global variables ====
-ref_tab = pd.read_csv(path_to_ref_tab)
+# Cache of page validators and content hashes from previous runs, used to skip
+# stations whose pages haven't changed
+page_cache = PageCache(fpaths['page_cache'])
 
-# Getting station names correctly formatted
-names = ref_tab["station_url_name"]
+# Archive of the raw html of every downloaded page, so that pages can be
+# re-parsed later without re-scraping
+page_archive = PageArchive(fpaths['page_archive'])
+
+# How far before a station's latest stored reading its readings are loaded
+# again, so that revisions of recent readings are picked up
+revision_lookback = timedelta(days=fetch_opts.get('revision_lookback_days', 7))
+
+# %% ==== Initializing script global variables ====
+registry = StationRegistry.from_csv(path_to_ref_tab)
 
 # %% Reading the data table to be updated --------
 
@@ -62,7 +83,7 @@ names = ref_tab["station_url_name"]
 dtype_dict = {
     'STATION_NUMBER': 'str',
     'STATION_NAME': 'str',
-    'Date': 'datetime64',
+    'Date': 'datetime64[ns]',
     'Time': 'str',
     'Value': 'float64',
     'Parameter': 'str',
@@ -70,25 +91,22 @@ dtype_dict = {
     'Comments': 'str',
 }
 
-# Querying only the last 30 days of data from the database
-cursor.execute(
-    """
-    select * from pacfish.hourly 
-    where "Date" >= '{}'
-    """.format((datetime.today() - timedelta(days=30)).strftime('%Y-%m-%d'))
-)
-# Reading the result
-curr_data = pd.DataFrame(cursor.fetchall(), columns=list(dtype_dict.keys()))
-# Ensuring type consistency
-curr_data = curr_data.astype(dtype_dict)
-
-# %% ==== Preparing and validating data URLs ====
-
-# A function that returns the station URL names for each station that has data
+# Making sure the hourly table has its unique reading key, so that readings
+# already stored are skipped by the database when loading, and reading the
+# time of the latest stored reading of each station and parameter
+ensure_hourly_tables(conn, creds['schema'])
+hwm = read_hwm(conn, creds['schema'])
+
+# Bulk loader writing the formatted data of many stations per transaction
+loader = BulkLoader(conn, creds['schema'], commit_rows=fetch_opts['load_commit_rows'])
+
+# %% ==== Preparing data URLs ====
+
+# Station URLs (precomputed by the registry) for each station that has data
 # associated with a certain variable
-hyd_links = get_urls_by_variable('staff_gauge', ref_tab)
-press_links = get_urls_by_variable('barometric_pressure', ref_tab)
-temp_links = get_urls_by_variable('water_temperature', ref_tab)
+hyd_links = registry.urls_by_variable('staff_gauge')
+press_links = registry.urls_by_variable('barometric_pressure')
+temp_links = registry.urls_by_variable('water_temperature')
 
 # Storing these themselves in a dict to allow for appropriate naming during the cleaning stage
 links = {
@@ -97,107 +115,100 @@ links = {
     'Temperature': temp_links
     }
 
-# %% Checking that the urls are valid --------
-hyd_codes = {name: requests.get(
-    link).status_code for name, link in hyd_links.items()}
-print("Hydrometric links checked")
-press_codes = {name: requests.get(
-    link).status_code for name, link in hyd_links.items()}
-print("Pressure links checked")
-temp_codes = {name: requests.get(
-    link).status_code for name, link in temp_links.items()}
-print("Temperature links checked")
+# %% ==== Downloading each link and appending it's data ====
+
+# Flattening the links into a single dictionary keyed by (group, station), so
+# that all pages can be downloaded concurrently
+all_links = flatten_links(links)
+print("Downloading", len(all_links), "station pages")
+
+# Each page is only requested once: the response (or download error) is cached
+# here for the validity check, and the body is parsed straight away
+responses = {url_grp: {} for url_grp in links}
+# Errors raised while formatting or writing a valid page, and pages skipped
+# because they haven't changed since the last run
+scrape_status = {url_grp: {} for url_grp in links}
+# Pages queued for loading, recorded in the page cache once committed
+queued_pages = {}
+
+# Processing each page as soon as its download finishes
+for (url_grp, url_name), page, err in fetch_as_completed(
+        all_links,
+        partial(page_cache.get, client),
+        max_concurrency=fetch_opts['max_concurrency'],
+        max_per_host=fetch_opts['max_per_host']):
+    # Caching the result for the validity check
+    responses[url_grp][url_name] = page if err is None else err
+    # Skipping invalid links - these are reported by the validity check below
+    if err is not None or page.status_code not in (200, 304):
+        continue
+    # Skipping parsing and loading entirely if the page hasn't changed
+    if page_cache.is_unchanged(all_links[(url_grp, url_name)], page):
+        scrape_status[url_grp][url_name] = "success (unchanged)"
+        continue
+    try:
+        # Archiving the raw page
+        page_archive.store(page.content, url_name, url_grp, source='7-day')
+        # Parsing and formatting the data table to GW specifications
+        # (dropping stored readings older than the revision lookback)
+        since = revision_cutoff(hwm, registry.by_url_name(url_name)['station_id'], url_grp,
+                                revision_lookback)
+        df = parse_station_page(page.content, url_grp, url_name, registry, dtype_dict, since=since)
+
+        # Queueing the data for the bulk loader, which loads it with other
+        # stations once enough rows are gathered - new readings are inserted,
+        # revised readings updated and unchanged readings skipped
+        queued_pages[(url_grp, url_name)] = page
+        loader.add(df, tag=(url_grp, url_name))
+        # Status update
+        print("Formatted data for Station: ",
+              url_name, ", Data type:", url_grp, "(" + str(df.shape[0]), "rows)")
+    except Exception as e:
+        # Printing a message in case of an error
+        print(url_grp, "data scrape failed for station:", url_name)
+        print("Error:", str(e))
+        # Saving the error message for the status report
+        scrape_status[url_grp][url_name] = "Error: " + str(e)
+
+# Loading any data still queued
+loader.flush()
+load_summary = loader.summary()
+print("Bulk load summary:", load_summary)
+
+# Recording committed pages as loaded, so they can be skipped until they
+# change, and saving the errors of pages that failed to load
+for url_grp, url_name in loader.committed:
+    page_cache.store(all_links[(url_grp, url_name)], queued_pages[(url_grp, url_name)])
+for (url_grp, url_name), e in loader.failed.items():
+    print(url_grp, "data load failed for station:", url_name)
+    print("Error:", str(e))
+    scrape_status[url_grp][url_name] = "Error: " + str(e)
+
+# Saving the page cache for the next run
+page_cache.save()
 
 #%% Saving validity status --------
 
 # Creating dictionaries storing the successful data scrape status associated
-# with each link. For any links that failed the validity check, setting their
-# sucess status to False
-hyd_success, hyd_all_valid = check_success_status(hyd_codes)
+# with each link, using the responses cached during the download
+hyd_success, hyd_all_valid = check_success_status(responses['Hydrometric'])
 print("Hydrometric links all valid:", hyd_all_valid)
 
-press_success, press_all_valid = check_success_status(press_codes)
+press_success, press_all_valid = check_success_status(responses['Pressure'])
 print("Pressure links all valid:", press_all_valid)
 
-temp_success, temp_all_valid = check_success_status(temp_codes)
+temp_success, temp_all_valid = check_success_status(responses['Temperature'])
 print("Temperature links all valid:", temp_all_valid)
 
-# Creating a "success status" dictionary from these (will be updating with later
-# error checking too)
+# Creating a "success status" dictionary from these, and adding any errors
+# raised while processing valid links
 success_status = {
     'Hydrometric': hyd_success, 
     'Pressure': press_success,
     'Temperature': temp_success
 }
-
-# Filtering the links dictionaries based on their validity status (i.e removing
-# failed links if present)
-links['Hydrometric'] = {name: link for name,
-                        link in links['Hydrometric'].items() if hyd_success[name] == 'success'}
-links['Pressure'] = {name: link for name,
-                        link in links['Pressure'].items() if press_success[name] == 'success'}
-links['Temperature'] = {name: link for name,
-                        link in links['Temperature'].items() if temp_success[name] == 'success'}
-
-# %% ==== Iterating over each valid link and appending it's data ====
-
-# url_grp = list(links.keys())[0]
-# url_name = list(links[url_grp].keys())[14]
-
-# For each link group
-for url_grp in links:
-    print("Iterating", url_grp, "links")
-    # Getting the links associated with that group
-    curr_url_grp = links[url_grp]
-    # For each url in this group of urls
-    for url_name in curr_url_grp:
-        try:
-            # Getting the url from the dict using the key
-            url = links[url_grp][url_name]
-            # Opening page
-            page = requests.get(url)
-            # Parsing with beautiful soup
-            soup = BeautifulSoup(page.content, 'html.parser')
-            # Using beautiful soup to find the data table element by class and id
-            stat_table = soup.find(attrs={'class': 'CenteredGrid'})
-            # Converting it to a pandas dataframe
-            df = pd.read_html(str(stat_table))[0]
-
-            # Formatting the dataframe to GW specifications by calling the function
-            # defined above
-            df = format_station_data(df, url_grp, url_name, ref_tab)
-            # Ensuring types are consistently set
-            df = df.astype(dtype_dict)
-
-            # Doing an anti-join with existing set of recent data, to ensure
-            # overlaps are removed. To do so, first a left join with an 'indicator'
-            # is needed
-            left_joined = df.merge(curr_data, how='left', indicator=True)
-            # Keeping only those df rows where the merge indicator says "left_only"
-            left_joined = left_joined[left_joined._merge == "left_only"]
-            df = left_joined.drop(columns="_merge")
-
-            # Rearranging columns to match specification
-            df = df[['STATION_NUMBER', 'STATION_NAME', 'Date', 'Time',
-                    'Value', 'Parameter', 'Code', 'Comments']]
-
-            # Initialize an empty string buffer
-            sio = StringIO()    
-            # Appending these rows to the complete csv
-            df.to_csv(sio, sep = ',', header=False, index=False, columns = list(dtype_dict.keys()))
-            sio.seek(0)
-            # Appending to database from from buffer
-            cursor.copy_from(sio, "hourly", sep = ',')
-            conn.commit()
-            # Status update
-            print("Successfully completed data pull for Station: ",
-                  url_name, ", Data type:", url_grp)
-        except Exception as e:
-            # Printing a message in case of an error
-            print(url_grp, "data scrape failed for station:", url_name)
-            print("Error:", str(e))
-            # Saving the error message in the success dictionary
-            success_status[url_grp][url_name] = "Error: " + str(e)
+for url_grp in scrape_status:
+    success_status[url_grp].update(scrape_status[url_grp])
 
 # %% ==== Writing a status txt file giving details of this run ====
 
@@ -216,6 +227,12 @@ with open(path_to_report, "w") as f:
     print('All pressure links valid:', press_all_valid, file=f)
     print('All temperature links valid:', temp_all_valid, file=f)
     print('', file=f)
+    # Request latencies and retries over the run
+    print('HTTP request summary:', client.latency_summary(), file=f)
+    print('Rate limiter state:', client.rate_summary(), file=f)
+    # Rows loaded and load rate
+    print('Bulk load summary:', load_summary, file=f)
+    print('', file=f)
     # Station-wise status for Hydrometric data (formatted as a dataframe for easy reading)
     print('Hydrometric data station completion status:', file=f)
     print(pd.DataFrame.from_dict(success_status['Hydrometric'], orient='index').rename(
@@ -9,16 +9,19 @@ import sys
 from pathlib import Path
 os.chdir(Path(__file__).parent.parent.parent)
 sys.path.append(os.getcwd())
-import requests
 import pandas as pd
 from datetime import datetime, timedelta
-from selenium import webdriver
-from bs4 import BeautifulSoup
-from io import StringIO
 from optparse import OptionParser
 from sqlalchemy import create_engine
 from json import load
-from scripts.update.update_help_funcs import format_station_data, get_urls_by_variable, check_success_status
+from scripts.update.update_help_funcs import parse_station_page, check_success_status, revision_cutoff
+from scripts.common.http_session import HttpClient
+from scripts.common.page_archive import PageArchive
+from scripts.common.station_registry import StationRegistry
+from scripts.common.hourly_load import ensure_hourly_tables, read_hwm
+from scripts.common.bulk_loader import BulkLoader
+from scripts.common.postback import fetch_date_range
+from scripts.common.async_fetch import fetch_as_completed, fetch_link_groups, flatten_links
 
 #%% Initializing option parsing
 parser = OptionParser()
@@ -34,6 +37,13 @@ creds = load(open('options/credentials.json',))
 # Reading filepaths from JSON
 fpaths = load(open('options/filepaths.json',))
 
+# Reading download settings (concurrency, timeouts and retries) from JSON
+fetch_opts = load(open('options/fetch.json',))
+
+# Shared HTTP client (pooled connections, timeouts and retries) used for every
+# request made during this run
+client = HttpClient.from_options(fetch_opts)
+
 # Setting the default schema to 'pacfish' unless another was specified in the file
 if 'schema' not in creds.keys():
     creds['schema'] = 'pacfish'
@@ -58,20 +68,22 @@ path_to_report = fpaths['report']
 # the data folder under the current working directory
 path_to_ref_tab =  fpaths['station_data']
 
-# How many days worth of data is required
+# How many days worth of data is required (at most)
 time_diff = timedelta(days=int(options.days))
 
-# Path to the geckodriver that runs firefox in automative mode
-gecko_path = fpaths['geckodriver']
+# How far before a station's latest stored reading its data are requested and
+# loaded again, so that revisions of recent readings are picked up
+revision_lookback = timedelta(days=fetch_opts.get('revision_lookback_days', 7))
+
+# Archive of the raw html of every downloaded page, so that pages can be
+# re-parsed later without re-scraping
+page_archive = PageArchive(fpaths['page_archive'])
 
 # %% ==== Reading the reference table for station names and IDs ====
-ref_tab = pd.read_csv(path_to_ref_tab)
+registry = StationRegistry.from_csv(path_to_ref_tab)
 
 # Removing stations that don't exist
-# ref_tab = ref_tab[~ref_tab.status.str.match('INACTIVE')]
-
-# Getting station names correctly formatted
-names = ref_tab["station_url_name"]
+# registry = StationRegistry(registry.ref_tab[~registry.ref_tab.status.str.match('INACTIVE')])
 
 # %% Reading the master pacfish table --------
 
@@ -80,7 +92,7 @@ names = ref_tab["station_url_name"]
 dtype_dict = {
     'STATION_NUMBER': 'str',
     'STATION_NAME': 'str',
-    'Date': 'datetime64',
+    'Date': 'datetime64[ns]',
     'Time': 'str',
     'Value': 'float64',
     'Parameter': 'str',
@@ -88,25 +100,22 @@ dtype_dict = {
     'Comments': 'str',
 }
 
-# Querying only the last 30 days of data from the database
-cursor.execute(
-    """
-    select * from pacfish.hourly 
-    where "Date" >= '{}'
-    """.format((datetime.today() - time_diff).strftime('%Y-%m-%d'))
-)
-# Reading the result
-curr_data = pd.DataFrame(cursor.fetchall(), columns=list(dtype_dict.keys()))
-# Ensuring type consistenct
-curr_data = curr_data.astype(dtype_dict)
+# Making sure the hourly table has its unique reading key, so that readings
+# already stored are skipped by the database when loading, and reading the
+# time of the latest stored reading of each station and parameter
+ensure_hourly_tables(conn, creds['schema'])
+hwm = read_hwm(conn, creds['schema'])
+
+# Bulk loader writing the formatted data of many stations per transaction
+loader = BulkLoader(conn, creds['schema'], commit_rows=fetch_opts['load_commit_rows'])
 
 # %% ==== Preparing and validating data URLs ====
 
-# A function that returns the station URL names for each station that has data
+# Station URLs (precomputed by the registry) for each station that has data
 # associated with a certain variable
-hyd_links = get_urls_by_variable('staff_gauge', ref_tab)
-press_links = get_urls_by_variable('barometric_pressure', ref_tab)
-temp_links = get_urls_by_variable('water_temperature', ref_tab)
+hyd_links = registry.urls_by_variable('staff_gauge')
+press_links = registry.urls_by_variable('barometric_pressure')
+temp_links = registry.urls_by_variable('water_temperature')
 
 # Storing these themselves in a dict to allow for appropriate naming during the cleaning stage
 links = {
@@ -116,27 +125,28 @@ links = {
     }
 
 # %% Checking that the urls are valid --------
-hyd_codes = {name: requests.get(
-    link).status_code for name, link in hyd_links.items()}
-print("Hydrometric links checked")
-press_codes = {name: requests.get(
-    link).status_code for name, link in hyd_links.items()}
-print("Pressure links checked")
-temp_codes = {name: requests.get(
-    link).status_code for name, link in temp_links.items()}
-print("Temperature links checked")
+
+# The page bodies are kept, since they hold the form state needed to request
+# the date range below
+responses = fetch_link_groups(
+    links,
+    client,
+    max_concurrency=fetch_opts['max_concurrency'],
+    max_per_host=fetch_opts['max_per_host']
+)
+print("Links checked")
 
 #%% Saving validity status --------
 # Creating dictionaries storing the successful data scrape status associated
 # with each link. For any links that failed the validity check, setting their
 # sucess status to False
-hyd_success, hyd_all_valid = check_success_status(hyd_codes)
+hyd_success, hyd_all_valid = check_success_status(responses['Hydrometric'])
 print("Hydrometric links all valid:", hyd_all_valid)
 
-press_success, press_all_valid = check_success_status(press_codes)
+press_success, press_all_valid = check_success_status(responses['Pressure'])
 print("Pressure links all valid:", press_all_valid)
 
-temp_success, temp_all_valid = check_success_status(temp_codes)
+temp_success, temp_all_valid = check_success_status(responses['Temperature'])
 print("Temperature links all valid:", temp_all_valid)
 
 # Creating a "success status" dictionary from these (will be updating with later
@@ -156,102 +166,82 @@ links['Pressure'] = {name: link for name,
 links['Temperature'] = {name: link for name,
                         link in links['Temperature'].items() if temp_success[name] == 'success'}
 
-# %% ==== Automating downloads with Selenium ====
-
-# Opening firefox driver
-browser = webdriver.Firefox(executable_path = gecko_path)
-# url_grp = list(links.keys())[0]
-# url_name = list(links[url_grp].keys())[14]
-
-# Getting the correctly formatted date from when we want data
-start_date = (datetime.today() - time_diff).strftime('%b %d, %Y 00:00')
-
-# Iterating over each url and group
-for url_grp in links:
-    print("Iterating", url_grp, "links")
-    # Getting the links associated with that group
-    curr_url_grp = links[url_grp]
-    # For each url in this group of urls
-    for url_name in curr_url_grp:
-        try:
-            # Navigating to url
-            browser.get(links[url_grp][url_name])
-
-            # Setting the date value in this date-picker to be the date we're
-            # interested in (keep trying until it works or exceeded max tries)
-            iters = 0
-            curr_elem_val = ''
-            while(curr_elem_val != start_date):
-                # Refreshing the browswer
-                browser.refresh()
-                # Getting the 'from' date element
-                elem = browser.find_element_by_id(
-                    'ContentPlaceHolder1_DateTimePicker')
-                # Trying to set the value tag to the start date for the data
-                browser.execute_script(
-                    'arguments[0].setAttribute("value", "%s")' % start_date, elem)
-                # Getting the current element value following the set attempt
-                curr_elem_val = elem.get_attribute('value')
-                # Incrementing max iterations by 1
-                iters += 1
-                # If iterations exceed 5, breaking the loop with an error
-                if(iters == 6):
-                    print("Maximum iterations reached without success")
-                    break
-            else:
-                print("Date successfully set after", iters, "iterations")
-
-            # Clicking button to get tabular data for these dates
-            browser.find_element_by_id('ContentPlaceHolder1_Button1').click()
-
-            # Parsing the page's source html with BeautifulSoup
-            soup = BeautifulSoup(browser.page_source, 'html.parser')
-
-            # Getting data table element by class (using beautiful soup)
-            stat_table = soup.find(attrs={'class': 'CenteredGrid'})
-
-            # Converting it to a pandas dataframe
-            df = pd.read_html(str(stat_table))[0]
-
-            # Formatting the dataframe to GW specifications by calling the function
-            # defined above
-            df = format_station_data(df, url_grp, url_name, ref_tab)
-            # Ensuring types are consistently set
-            df = df.astype(dtype_dict)
-
-            # Doing an anti-join with existing set of recent data, to ensure
-            # overlaps are removed. To do so, first a left join with an 'indicator'
-            # is needed
-            left_joined = df.merge(curr_data, how='left', indicator=True)
-            # Keeping only those df rows where the merge indicator says "left_only"
-            left_joined = left_joined[left_joined._merge == "left_only"]
-            df = left_joined.drop(columns="_merge")
-
-            # Rearranging columns to match specification
-            df = df[['STATION_NUMBER', 'STATION_NAME', 'Date', 'Time',
-                    'Value', 'Parameter', 'Code', 'Comments']]
-
-            # Initialize an empty string buffer
-            sio = StringIO()    
-            # Writing the data to a csv buffer
-            df.to_csv(sio, sep = ',', header=False, index=False, columns = list(dtype_dict.keys()))
-            sio.seek(0)
-            # Appending to database from from buffer
-            cursor.copy_from(sio, "hourly", sep = ',')
-            conn.commit()
-
-            # Status update
-            print("Successfully completed data pull for Station: ",
-                  url_name, ", Data type:", url_grp)
-        except Exception as e:
-            # Printing a message in case of an error
-            print(url_grp, "data scrape failed for station:", url_name)
-            print("Error:", str(e))
-            # Saving the error message in the success dictionary
-            success_status[url_grp][url_name] = "Error: " + str(e)
-
-# Closing selenium server
-browser.close()
+# %% ==== Requesting the date range from each valid link ====
+
+# Earliest date from when we want data (midnight, `--days` days ago)
+earliest_date = datetime.combine((datetime.today() - time_diff).date(), datetime.min.time())
+
+# Each station's page is requested from the revision lookback before the
+# latest reading already stored for it, so only new and recently revisable
+# data are downloaded. Stations without stored data (or whose latest reading
+# is older) go back to the earliest date
+all_links = flatten_links(links)
+cutoffs = {
+    url: revision_cutoff(hwm, registry.by_url_name(url_name)['station_id'], url_grp,
+                         revision_lookback)
+    for (url_grp, url_name), url in all_links.items()
+}
+start_dates = {
+    url: earliest_date if cutoff is None else max(earliest_date, cutoff)
+    for url, cutoff in cutoffs.items()
+}
+print("Requesting", sum(start > earliest_date for start in start_dates.values()), "of",
+      len(start_dates), "pages from their latest stored reading (less the revision lookback)")
+
+# Submitting each page's date-picker form directly, reusing the form state
+# from the page downloaded during the validity check
+pages = {
+    url: responses[url_grp][url_name].content
+    for (url_grp, url_name), url in all_links.items()
+}
+def fetch_recent(url):
+    return fetch_date_range(client, url, start_dates[url], page=pages[url])
+
+# Processing each station as soon as its data arrive
+for (url_grp, url_name), page, err in fetch_as_completed(
+        all_links,
+        fetch_recent,
+        max_concurrency=fetch_opts['max_concurrency'],
+        max_per_host=fetch_opts['max_per_host']):
+    try:
+        # Raising any error from the form submission itself
+        if err is not None:
+            raise err
+
+        # Archiving the raw page
+        page_archive.store(page.content, url_name, url_grp, source='postback')
+
+        # Parsing and formatting the data table to GW specifications
+        # (dropping stored readings older than the revision lookback - every
+        # reading is kept for stations without stored data)
+        df = parse_station_page(page.content, url_grp, url_name, registry, dtype_dict,
+                                since=cutoffs[all_links[(url_grp, url_name)]])
+
+        # Queueing the data for the bulk loader, which loads it with other
+        # stations once enough rows are gathered - new readings are inserted,
+        # revised readings updated and unchanged readings skipped
+        loader.add(df, tag=(url_grp, url_name))
+
+        # Status update
+        print("Formatted data for Station: ",
+              url_name, ", Data type:", url_grp, "(" + str(df.shape[0]), "rows)")
+    except Exception as e:
+        # Printing a message in case of an error
+        print(url_grp, "data scrape failed for station:", url_name)
+        print("Error:", str(e))
+        # Saving the error message in the success dictionary
+        success_status[url_grp][url_name] = "Error: " + str(e)
+
+# Loading any data still queued, and saving the errors of stations that
+# failed to load
+loader.flush()
+load_summary = loader.summary()
+print("Bulk load summary:", load_summary)
+for (url_grp, url_name), e in loader.failed.items():
+    print(url_grp, "data load failed for station:", url_name)
+    print("Error:", str(e))
+    success_status[url_grp][url_name] = "Error: " + str(e)
+
 cursor.close()
 
 # %% ==== Writing a status txt file giving details of this run ====
@@ -271,6 +261,12 @@ with open(path_to_report, "w") as f:
     print('All pressure links valid:', press_all_valid, file=f)
     print('All temperature links valid:', temp_all_valid, file=f)
     print('', file=f)
+    # Request latencies and retries over the run
+    print('HTTP request summary:', client.latency_summary(), file=f)
+    print('Rate limiter state:', client.rate_summary(), file=f)
+    # Rows loaded and load rate
+    print('Bulk load summary:', load_summary, file=f)
+    print('', file=f)
     # Station-wise status for Hydrometric data (formatted as a dataframe for easy reading)
     print('Hydrometric data station completion status:', file=f)
     print(pd.DataFrame.from_dict(success_status['Hydrometric'], orient='index').rename(
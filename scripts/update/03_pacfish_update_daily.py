@@ -0,0 +1,83 @@
+# Date: 17/10/2026
+
+# Description: A script that updates the ancilliary data tables from the
+# hourly data (scraped by the pacfish_update_*.py scripts). Only the daily
+# rows of days touched since the last run are recomputed. Replaces
+# 03_pacfish_create_ancil_dbases.R
+
+# %% ==== Loading libraries ====
+import os
+import sys
+from pathlib import Path
+os.chdir(Path(__file__).parent.parent.parent)
+sys.path.append(os.getcwd())
+from datetime import datetime
+from optparse import OptionParser
+from json import load
+import psycopg2
+from scripts.common.daily_agg import ensure_daily_tables, refresh_daily, rebuild_daily
+from scripts.common.hourly_schema import recent_view_exists, ensure_recent_view
+
+# %% Initializing option parsing
+parser = OptionParser()
+parser.add_option(
+    "-f", "--full",
+    dest="full",
+    action="store_true",
+    default=False,
+    help="""
+    Recompute the whole daily table instead of only the days touched since the last run
+    """
+)
+options, args = parser.parse_args()
+
+# %% ==== Initalizing global variables ====
+
+# Reading credentials from JSON
+creds = load(open('options/credentials.json',))
+
+# Setting the default schema to 'pacfish' unless another was specified in the file
+if 'schema' not in creds.keys():
+    creds['schema'] = 'pacfish'
+
+# Database connection
+conn = psycopg2.connect(
+    host=creds['host'],
+    port=creds['port'],
+    dbname=creds['dbname'],
+    user=creds['user'],
+    password=creds['password']
+)
+
+# %% ==== Daily mean dataset ====
+
+# Creating the daily and pending tables if needed
+ensure_daily_tables(conn, creds['schema'])
+
+start = datetime.now()
+if options.full:
+    nrows = rebuild_daily(conn, creds['schema'])
+    print("Rebuilt the daily table:", nrows, "rows in", str(datetime.now() - start))
+else:
+    ndays = refresh_daily(conn, creds['schema'])
+    print("Refreshed", ndays, "station days in", str(datetime.now() - start))
+
+# %% ==== Past 1-year dataset ====
+
+# hourly_recent is a view of the hourly table that is always current, so it
+# only needs creating once (replacing the table the R script used to rebuild)
+cursor = conn.cursor()
+try:
+    if not recent_view_exists(cursor, creds['schema']):
+        print("Creating the hourly_recent view...")
+        ensure_recent_view(cursor, creds['schema'])
+    conn.commit()
+except Exception:
+    conn.rollback()
+    raise
+finally:
+    cursor.close()
+
+# %% ==== Disconnecting ====
+conn.close()
+# %%
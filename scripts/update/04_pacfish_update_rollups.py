@@ -0,0 +1,61 @@
+# Date: 17/10/2026
+
+# Description: A script that rebuilds the rollup tables (summary statistics of
+# the hourly data by day, month and year, or whichever levels are set in
+# options/rollups.json) in a single scan of the hourly table
+
+# %% ==== Loading libraries ====
+import os
+import sys
+from pathlib import Path
+os.chdir(Path(__file__).parent.parent.parent)
+sys.path.append(os.getcwd())
+from datetime import datetime
+from optparse import OptionParser
+from json import load
+import psycopg2
+from scripts.common.rollups import RollupEngine
+
+# %% Initializing option parsing
+parser = OptionParser()
+parser.add_option(
+    "-l", "--level",
+    dest="levels",
+    action="append",
+    help="""
+    Rollup level to rebuild (can be given more than once). Defaults to every level in options/rollups.json
+    """
+)
+options, args = parser.parse_args()
+
+# %% ==== Initalizing global variables ====
+
+# Reading credentials from JSON
+creds = load(open('options/credentials.json',))
+
+# Reading the rollup levels and statistics from JSON
+rollup_opts = load(open('options/rollups.json',))
+
+# Setting the default schema to 'pacfish' unless another was specified in the file
+if 'schema' not in creds.keys():
+    creds['schema'] = 'pacfish'
+
+# Database connection
+conn = psycopg2.connect(
+    host=creds['host'],
+    port=creds['port'],
+    dbname=creds['dbname'],
+    user=creds['user'],
+    password=creds['password']
+)
+
+# %% ==== Computing and writing the rollups ====
+engine = RollupEngine.from_options(rollup_opts, options.levels)
+start = datetime.now()
+counts = engine.run(conn, creds['schema'], rollup_opts.get('scan_rows', 500000))
+conn.close()
+
+print("Scanned", engine.rows_scanned, "hourly readings in", str(datetime.now() - start))
+for level, nrows in counts.items():
+    print("Wrote", nrows, "rows to", engine.table_name(level))
+# %%
@@ -0,0 +1,6 @@
+# Description: Making the repository's scripts package importable by the tests
+
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
@@ -0,0 +1,172 @@
+# Description: Tests of the date-picker form postback (fetch_date_range and
+# stream_date_range) against a small local stand-in for a Pacfish station page
+
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+import pytest
+from scripts.common.http_session import HttpClient
+from scripts.common.postback import (
+    fetch_date_range, stream_date_range, read_picker_dates, read_first_reading_date,
+    has_data_table, NoDataTable,
+    START_PICKER_ID, END_PICKER_ID, SUBMIT_ID, DATE_FORMAT
+)
+
+# Date of the first reading of the stand-in station
+FIRST_READING = datetime(2020, 1, 1)
+
+# Form state the stand-in expects to be posted back
+VIEWSTATE = 'dDwtMTIzNDU2Nzg5Ozs+'
+EVENTVALIDATION = 'wEWBAL+raDpAgKM54rGBg=='
+
+def form_page(start, end, table=''):
+    """
+    Building the html of a station page with its date-picker form, and
+    optionally a data table. The page's stylesheet mentions the table's class
+    whether or not the table is there, like the website's
+    """
+    return """<html><head><style>.CenteredGrid td {{ padding: 2px; }}</style></head>
+        <body><form method="post">
+        <input type="hidden" name="__VIEWSTATE" value="{viewstate}" />
+        <input type="hidden" name="__EVENTVALIDATION" value="{validation}" />
+        <input type="text" id="{start_id}" name="ctl00$Start" value="{start}" />
+        <input type="text" id="{end_id}" name="ctl00$End" value="{end}" />
+        <input type="submit" id="{submit_id}" name="ctl00$Button1" value="Submit" />
+        </form>{table}</body></html>""".format(
+        viewstate=VIEWSTATE, validation=EVENTVALIDATION,
+        start_id=START_PICKER_ID, end_id=END_PICKER_ID, submit_id=SUBMIT_ID,
+        start=start.strftime('%b %d, %Y %I:%M %p'), end=end.strftime('%b %d, %Y %I:%M %p'),
+        table=table
+    ).encode('utf-8')
+
+def data_table(nrows):
+    """
+    Building a CenteredGrid data table with nrows readings
+    """
+    rows = ''.join(
+        '<tr><td>2020/01/01</td><td>{:02d}:00</td><td>{}</td></tr>'.format(i % 24, i)
+        for i in range(nrows)
+    )
+    return '<table class="CenteredGrid"><tr><th>Date</th><th>Time</th><th>Value</th></tr>{}</table>'.format(rows)
+
+class StationHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for a station page. Posts with a start date before the first
+    reading get the form back with the start date corrected and no table, like
+    the website. Pages under /empty never return a table
+    """
+    def log_message(self, *args):
+        pass
+
+    def send_page(self, content):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        self.send_page(form_page(datetime(2024, 1, 1), datetime(2024, 1, 8)))
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8')
+        form = {key: values[0] for key, values in parse_qs(body).items()}
+        self.server.posts.append(form)
+        # Rejecting posts that don't carry the form state back
+        if form.get('__VIEWSTATE') != VIEWSTATE or form.get('__EVENTVALIDATION') != EVENTVALIDATION \
+                or 'ctl00$Button1' not in form:
+            self.send_response(400)
+            self.end_headers()
+            return
+        start = read_date(form['ctl00$Start'])
+        end = read_date(form['ctl00$End'])
+        if self.path.startswith('/empty') or start < FIRST_READING:
+            self.send_page(form_page(max(start, FIRST_READING), end))
+        else:
+            self.send_page(form_page(start, end, data_table(self.server.nrows)))
+
+def read_date(value):
+    """
+    Reading a date-picker value in either of its formats
+    """
+    try:
+        return datetime.strptime(value, '%b %d, %Y %I:%M %p')
+    except ValueError:
+        return datetime.strptime(value, DATE_FORMAT)
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StationHandler)
+    server.posts = []
+    server.nrows = 500
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def client():
+    return HttpClient(max_retries=0)
+
+def test_has_data_table_needs_table_element():
+    start, end = datetime(2024, 1, 1), datetime(2024, 1, 8)
+    assert not has_data_table(form_page(start, end))
+    assert has_data_table(form_page(start, end, data_table(1)))
+    assert not has_data_table('<script>var grid = "CenteredGrid";</script>')
+
+def test_fetch_posts_date_range(server, client):
+    resp = fetch_date_range(client, server.url + '/station', datetime(2023, 6, 1), datetime(2023, 7, 1))
+    assert b'CenteredGrid' in resp.content
+    assert len(server.posts) == 1
+    assert read_date(server.posts[0]['ctl00$Start']) == datetime(2023, 6, 1)
+    assert read_date(server.posts[0]['ctl00$End']) == datetime(2023, 7, 1)
+
+def test_fetch_reposts_corrected_start(server, client):
+    resp = fetch_date_range(client, server.url + '/station', datetime(2010, 1, 1), datetime(2023, 7, 1))
+    assert b'CenteredGrid' in resp.content
+    assert len(server.posts) == 2
+    # The second post keeps the start date the server filled in, and the requested end date
+    assert read_date(server.posts[1]['ctl00$Start']) == FIRST_READING
+    assert read_date(server.posts[1]['ctl00$End']) == datetime(2023, 7, 1)
+
+def test_fetch_reuses_given_page(server, client):
+    page = form_page(datetime(2024, 1, 1), datetime(2024, 1, 8))
+    fetch_date_range(client, server.url + '/station', datetime(2023, 6, 1), page=page)
+    # The end date is left as it was in the page
+    assert read_date(server.posts[0]['ctl00$End']) == datetime(2024, 1, 8)
+
+def test_fetch_raises_without_table(server, client):
+    with pytest.raises(NoDataTable):
+        fetch_date_range(client, server.url + '/empty', datetime(2023, 6, 1))
+    assert len(server.posts) == 2
+
+def test_stream_posts_date_range(server, client):
+    chunks = list(stream_date_range(client, server.url + '/station', datetime(2023, 6, 1),
+                                    datetime(2023, 7, 1), chunk_size=1024))
+    content = b''.join(chunks)
+    assert len(chunks) > 1
+    assert content == form_page(datetime(2023, 6, 1), datetime(2023, 7, 1), data_table(server.nrows))
+    assert len(server.posts) == 1
+
+def test_stream_reposts_corrected_start(server, client):
+    content = b''.join(stream_date_range(client, server.url + '/station', datetime(2010, 1, 1),
+                                         datetime(2023, 7, 1), chunk_size=1024))
+    assert b'CenteredGrid' in content
+    assert len(server.posts) == 2
+    assert read_date(server.posts[1]['ctl00$Start']) == FIRST_READING
+    assert read_date(server.posts[1]['ctl00$End']) == datetime(2023, 7, 1)
+    assert read_picker_dates(content) == (FIRST_READING, datetime(2023, 7, 1))
+
+def test_stream_raises_without_table(server, client):
+    with pytest.raises(NoDataTable):
+        list(stream_date_range(client, server.url + '/empty', datetime(2023, 6, 1), chunk_size=1024))
+    assert len(server.posts) == 2
+
+def test_first_reading_date(server, client):
+    assert read_first_reading_date(client, server.url + '/station') == FIRST_READING
+    # An earliest date after the first reading is accepted by the server and returned as is
+    assert read_first_reading_date(client, server.url + '/station',
+                                   earliest=datetime(2021, 3, 1)) == datetime(2021, 3, 1)